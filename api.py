@@ -0,0 +1,219 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, request
+from sqlalchemy import case
+
+from bulk import add_shows
+from cache import page_cache
+from models import db, Artist, MusicShow, Venue
+from streaming import gzip_response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+VENUE_FIELDS = (
+    "name",
+    "city",
+    "state",
+    "address",
+    "phone",
+    "genres",
+    "image_link",
+    "facebook_link",
+    "website",
+    "latitude",
+    "longitude",
+    "upcoming_show_count",
+    "past_show_count",
+    "show_count",
+    "next_show_at",
+)
+ARTIST_FIELDS = (
+    "name",
+    "city",
+    "state",
+    "phone",
+    "genres",
+    "image_link",
+    "facebook_link",
+    "seeking_venue",
+    "seeking_description",
+    "upcoming_show_count",
+    "past_show_count",
+    "show_count",
+    "next_show_at",
+)
+SHOW_COLUMNS = {
+    "start_time": MusicShow.start_time,
+    "venue_id": MusicShow.venue_id,
+    "venue_name": Venue.name,
+    "venue_image_link": Venue.image_link,
+    "artist_id": MusicShow.artist_id,
+    "artist_name": Artist.name,
+    "artist_image_link": Artist.image_link,
+}
+
+
+def dumps(data):
+    # orjson is optional, several times faster and writes datetimes in the
+    # same ISO 8601 form as the fallback.
+    if orjson is not None:
+        return orjson.dumps(data)
+    text = json.dumps(data, separators=(",", ":"), default=datetime.isoformat)
+    return text.encode("utf-8")
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype="application/json")
+
+
+def parse_ids():
+    try:
+        ids = [int(part) for part in request.args.get("ids", "").split(",") if part]
+    except ValueError:
+        abort(400, "ids must be a comma separated list of integers.")
+    if not ids:
+        abort(400, "ids is required.")
+    limit = current_app.config["API_MAX_IDS"]
+    if len(ids) > limit:
+        abort(400, "At most {} ids per request.".format(limit))
+    return list(dict.fromkeys(ids))
+
+
+def parse_list(name, available, default):
+    value = request.args.get(name)
+    if value is None:
+        return list(default)
+    names = [part.strip() for part in value.split(",") if part.strip()]
+    unknown = set(names) - set(available)
+    if unknown:
+        abort(400, "Unknown {}: {}.".format(name, ", ".join(sorted(unknown))))
+    return names
+
+
+def fetch(query, id_column, columns, ids, fields):
+    # One IN query for the whole batch, projecting only the requested fields.
+    rows = query.with_entities(
+        id_column.label("id"), *[columns[field].label(field) for field in fields]
+    ).filter(id_column.in_(ids))
+    return {row.id: row._asdict() for row in rows}
+
+
+def embed_shows(entities, owner_column, other):
+    # The past and upcoming shows of every entity of the batch, from a single
+    # joined query split here like find_shows does in app.py.
+    prefix = other.__tablename__
+    upcoming = case([(MusicShow.start_time > datetime.now(), True)], else_=False)
+    rows = (
+        db.session.query(
+            owner_column.label("owner_id"),
+            MusicShow.start_time,
+            other.id,
+            other.name,
+            other.image_link,
+            upcoming.label("upcoming"),
+        )
+        .join(other, getattr(MusicShow, prefix + "_id") == other.id)
+        .filter(owner_column.in_(list(entities)), MusicShow.start_time.isnot(None))
+        .order_by(MusicShow.start_time)
+    )
+    for entity in entities.values():
+        entity["past_shows"] = []
+        entity["upcoming_shows"] = []
+    for row in rows:
+        show = {
+            prefix + "_id": row.id,
+            prefix + "_name": row.name,
+            prefix + "_image_link": row.image_link,
+            "start_time": row.start_time,
+        }
+        key = "upcoming_shows" if row.upcoming else "past_shows"
+        entities[row.owner_id][key].append(show)
+
+
+def batch_response(entities, ids):
+    return json_response(
+        {
+            "data": [entities[entity_id] for entity_id in ids if entity_id in entities],
+            "missing": [entity_id for entity_id in ids if entity_id not in entities],
+        }
+    )
+
+
+@api.route("/venues")
+@db.read_only
+@page_cache.cached("venues", "shows")
+def venues():
+    ids = parse_ids()
+    fields = parse_list("fields", VENUE_FIELDS, VENUE_FIELDS)
+    embed = parse_list("embed", ("shows",), ())
+    columns = {field: getattr(Venue, field) for field in VENUE_FIELDS}
+    entities = fetch(db.session.query(Venue), Venue.id, columns, ids, fields)
+    if "shows" in embed and entities:
+        embed_shows(entities, MusicShow.venue_id, Artist)
+    return batch_response(entities, ids)
+
+
+@api.route("/artists")
+@db.read_only
+@page_cache.cached("artists", "shows")
+def artists():
+    ids = parse_ids()
+    fields = parse_list("fields", ARTIST_FIELDS, ARTIST_FIELDS)
+    embed = parse_list("embed", ("shows",), ())
+    columns = {field: getattr(Artist, field) for field in ARTIST_FIELDS}
+    entities = fetch(db.session.query(Artist), Artist.id, columns, ids, fields)
+    if "shows" in embed and entities:
+        embed_shows(entities, MusicShow.artist_id, Venue)
+    return batch_response(entities, ids)
+
+
+@api.route("/shows")
+@db.read_only
+@page_cache.cached("shows")
+def shows():
+    ids = parse_ids()
+    fields = parse_list("fields", SHOW_COLUMNS, SHOW_COLUMNS)
+    query = (
+        db.session.query(MusicShow)
+        .join(Venue, MusicShow.venue_id == Venue.id)
+        .join(Artist, MusicShow.artist_id == Artist.id)
+    )
+    entities = fetch(query, MusicShow.id, SHOW_COLUMNS, ids, fields)
+    return batch_response(entities, ids)
+
+
+@api.route("/shows", methods=["POST"])
+def create_shows():
+    # A list of shows, or {"shows": [...]}, see bulk.add_shows.
+    body = request.get_json(silent=True)
+    rows = body.get("shows") if isinstance(body, dict) else body
+    if not isinstance(rows, list) or not rows:
+        abort(400, "Expected a list of shows.")
+    limit = current_app.config["BULK_SHOWS_MAX"]
+    if len(rows) > limit:
+        abort(400, "At most {} shows can be listed at once.".format(limit))
+    created, errors = add_shows(rows)
+    return json_response(
+        {
+            "created": created,
+            "errors": [{"row": number, "error": error} for number, error in errors],
+        },
+        201 if created else 422,
+    )
+
+
+@api.after_request
+def compress(response):
+    return gzip_response(response, current_app.config["API_GZIP_MIN_SIZE"])
+
+
+@api.errorhandler(400)
+@api.errorhandler(500)
+def error_response(error):
+    return json_response({"error": error.description}, error.code)
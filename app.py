@@ -2,65 +2,227 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-from datetime import datetime
+import csv
+import os
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+import click
 import dateutil.parser
-import babel
 from flask import (
+    Blueprint,
     Flask,
+    current_app,
+    abort,
     render_template,
     request,
     Response,
     flash,
     redirect,
+    stream_with_context,
     url_for,
     jsonify,
 )
+from flask.cli import with_appcontext
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, inspect, or_
 import logging
 from logging import Formatter, FileHandler
-from forms import VenueForm, ArtistForm, ShowForm
-from flask_migrate import Migrate
-from models import db, Venue, Artist, MusicShow
+from forms import VenueForm, ArtistForm, ShowForm, BulkShowForm
+from filters import format_datetime
+from flask_migrate import Migrate, stamp
+from models import db, Venue, Artist, MusicShow, DeletionJob
+from search import venue_search, artist_search, autocomplete
+from cache import page_cache
+from counters import count_show, rollover_command
+from bookings import BookingConflict, available_venues, book
+from facets import filter_conditions, genre_facets, parse_filters
+from geo import geocode, locate, venue_locator
+from metrics import query_metrics
+from importer import import_command
+from api import api
+from exporter import FORMATS, export_authorized, export_command, export_shows
+from partitions import partition_command
+from deletions import deleter, run_deletions_command
+from bulk import add_shows
+from assets import assets, build_assets_command
+from templating import compile_templates_command, template_cache
+from streaming import Page, gzip_streamed_response, render_streamed
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object("config")
-db.init_app(app)
-db.app = app
-migrate = Migrate(app, db)
-db.create_all()
-
-# DONE: connect to a local postgresql database
+moment = Moment()
+migrate = Migrate()
+main = Blueprint("main", __name__)
+
+
+def create_app(config=None):
+    """Build the application from config.py, overridden by config if given.
+
+    config is an import path such as "config.ProductionConfig" and defaults to
+    the FYYUR_CONFIG environment variable. No database access happens here:
+    the schema is created by `flask init-db` and migrated by `flask db upgrade`.
+    """
+    app = Flask(__name__)
+    app.config.from_object("config")
+    config = config or os.environ.get("FYYUR_CONFIG")
+    if config:
+        app.config.from_object(config)
+    if not app.debug and not app.config.get("SECRET_KEY"):
+        # Every worker must sign sessions, and so flashed messages, alike.
+        raise RuntimeError("SECRET_KEY must be set outside of debug mode.")
+
+    moment.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    page_cache.init_app(app)
+    query_metrics.init_app(app)
+    assets.init_app(app)
+    template_cache.init_app(app)
+    app.after_request(gzip_streamed_response)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(import_command)
+    app.cli.add_command(rollover_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(partition_command)
+    app.cli.add_command(run_deletions_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(compile_templates_command)
+    app.jinja_env.filters["datetime"] = format_datetime
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+
+    if not app.debug:
+        file_handler = FileHandler("error.log")
+        file_handler.setFormatter(
+            Formatter(
+                "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
+            )
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info("errors")
+    return app
+
+
+def warm_up(app):
+    # Run once in the gunicorn master so the forked workers share the loaded
+    # indexes and templates. Its connections must not be inherited by the
+    # workers.
+    with app.app_context():
+        template_cache.preload(app)
+        autocomplete.load()
+        venue_locator.load()
+        db.engine.dispose()
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create the tables of an empty database and stamp it as migrated."""
+    if inspect(db.engine).get_table_names():
+        raise click.ClickException(
+            "The database is not empty, run flask db upgrade instead."
+        )
+    db.create_all()
+    stamp()
+    click.echo("Database initialized.")
 
 
 # ----------------------------------------------------------------------------#
-# Filters.
+# Indexes.
 # ----------------------------------------------------------------------------#
 
+# The write handlers below report their committed changes here so the
+# in-process search and autocomplete indexes never need a database round trip,
+# and the cached pages depending on the change are invalidated.
+
+
+def show_tags(entity, ids):
+    return ["{}:{}".format(entity, entity_id) for entity_id in ids]
+
+
+def venue_artist_ids(venue_id):
+    rows = db.session.query(MusicShow.artist_id).filter_by(venue_id=venue_id)
+    return {row.artist_id for row in rows.distinct()}
+
+
+def artist_venue_ids(artist_id):
+    rows = db.session.query(MusicShow.venue_id).filter_by(artist_id=artist_id)
+    return {row.venue_id for row in rows.distinct()}
+
+
+def venue_changed(venue):
+    venue_search.add(venue)
+    autocomplete.add("venue", venue)
+    venue_locator.add(venue)
+    page_cache.invalidate(
+        "venues",
+        "shows",
+        "venue:{}".format(venue.id),
+        *show_tags("artist", venue_artist_ids(venue.id))
+    )
+
+
+@deleter.removed("venue")
+def venue_removed(venue_id, artist_ids):
+    venue_search.remove(venue_id)
+    autocomplete.remove("venue", venue_id)
+    venue_locator.remove(venue_id)
+    page_cache.invalidate(
+        "venues",
+        "artists",
+        "shows",
+        "venue:{}".format(venue_id),
+        *show_tags("artist", artist_ids)
+    )
+
+
+def artist_changed(artist):
+    artist_search.add(artist)
+    autocomplete.add("artist", artist)
+    page_cache.invalidate(
+        "artists",
+        "shows",
+        "artist:{}".format(artist.id),
+        *show_tags("venue", artist_venue_ids(artist.id))
+    )
+
+
+@deleter.removed("artist")
+def artist_removed(artist_id, venue_ids):
+    artist_search.remove(artist_id)
+    autocomplete.remove("artist", artist_id)
+    page_cache.invalidate(
+        "artists",
+        "venues",
+        "shows",
+        "artist:{}".format(artist_id),
+        *show_tags("venue", venue_ids)
+    )
 
-def format_datetime(value, format="medium"):
-    date = dateutil.parser.parse(value)
-    if format == "full":
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == "medium":
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
 
+def show_added(show):
+    # The listings show the counters of the venue and the artist.
+    page_cache.invalidate(
+        "venues",
+        "artists",
+        "shows",
+        "venue:{}".format(show.venue_id),
+        "artist:{}".format(show.artist_id),
+    )
 
-app.jinja_env.filters["datetime"] = format_datetime
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route("/", methods=["POST", "GET", "DELETE"])
+@main.route("/", methods=["POST", "GET", "DELETE"])
 def index():
     return render_template("pages/home.html")
 
@@ -69,135 +231,155 @@ def index():
 #  ----------------------------------------------------------------
 
 
-@app.route("/venues")
+@main.route("/venues")
+@db.read_only
+@page_cache.cached("venues")
 def venues():
     # DONE: replace with real venues data.
-    area_list = (
-        db.session.query(Venue.city, Venue.state, func.count(Venue.id))
-        .group_by(Venue.state, Venue.city)
-        .all()
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = current_app.config["AREAS_PER_PAGE"]
+    filters = parse_filters(request.args)
+    if filters is None:
+        abort(400)
+    conditions = filter_conditions(Venue, filters)
+
+    # Page over the distinct areas, then fetch only the id and name of the
+    # venues in those areas with a single ordered projection query, read as
+    # the page renders. One extra area is requested to know whether a next
+    # page exists.
+    area_page = (
+        db.session.query(
+            func.coalesce(Venue.state, "").label("state"),
+            func.coalesce(Venue.city, "").label("city"),
+        )
+        .filter(*conditions)
+        .distinct()
+        .order_by("state", "city")
+        .limit(per_page + 1)
+        .offset((page - 1) * per_page)
+        .subquery()
+    )
+    venue_list = (
+        db.session.query(
+            area_page.c.city,
+            area_page.c.state,
+            Venue.id,
+            Venue.name,
+            Venue.upcoming_show_count.label("num_upcoming_shows"),
+        )
+        .join(
+            area_page,
+            and_(
+                func.coalesce(Venue.state, "") == area_page.c.state,
+                func.coalesce(Venue.city, "") == area_page.c.city,
+            ),
+        )
+        .filter(*conditions)
+        .order_by(area_page.c.state, area_page.c.city, Venue.id)
+        .yield_per(100)
+    )
+    areas = (
+        {"city": city, "state": state, "venues": rows}
+        for (city, state), rows in groupby(venue_list, key=itemgetter(0, 1))
+    )
+    return render_streamed(
+        "pages/venues.html",
+        areas=Page(areas, per_page),
+        page=page,
+        filters=filters,
+        genres=genre_facets(Venue),
     )
-    data = []
-    for city, state, cnt in area_list:
-        if cnt > 0:
-            venue_list = Venue.query.filter(
-                Venue.city == city, Venue.state == state
-            ).all()
-            venues = []
-            for venue in venue_list:
-                venues.append(
-                    {
-                        "id": venue.id,
-                        "name": venue.name,
-                    }
-                )
-
-            data.append({"city": city, "state": state, "venues": venues})
-
-    return render_template("pages/venues.html", areas=data)
-
-
-@app.route("/venues/search", methods=["POST"])
+
+
+@main.route("/venues/search", methods=["POST"])
+@db.read_only
 def search_venues():
     # DONE: implement search on artists with partial string search.
     # Ensure it is case-insensitive.
     # Seach for Hop should return "The Musical Hop".
     # Search for "Music" should return "The Musical Hop"
     # and "Park Square Live Music & Coffee"
-    search_term = request.form.get("search_term")
-    venues = Venue.query.filter(Venue.name.ilike("%" + search_term + "%")).all()
-    data = []
-    for venue in venues:
-        data.append({"id": venue.id, "name": venue.name})
-
+    search_term = request.form.get("search_term", "")
+    data = venue_search.search(
+        search_term, limit=current_app.config["SEARCH_RESULT_LIMIT"]
+    )
     response = {"count": len(data), "data": data}
     return render_template(
         "pages/search_venues.html",
         results=response,
-        search_term=request.form.get("search_term", ""),
+        search_term=search_term,
     )
 
 
-def find_shows(venue_id=None, artist_id=None, upcoming=False):
+def show_lower_bound(entity):
+    # The earliest start_time the shows of a venue or an artist can have, so
+    # that Postgres skips the earlier music_show partitions. Without past
+    # shows none started before next_show_at: a show created in the past
+    # counts as past in its own transaction, and a lagging rollover only
+    # leaves started shows, all after next_show_at, counted as upcoming.
+    if not entity.past_show_count and entity.next_show_at is not None:
+        return entity.next_show_at
+    return None
+
+
+def find_shows(venue_id=None, artist_id=None, entity=None):
+    # Returns the (past_shows, upcoming_shows) of a venue or an artist, given
+    # as entity to bound the query by show_lower_bound. Both lists come from
+    # one query: the database labels each show with a CASE column and the
+    # rows are split here in start_time order.
     if venue_id is None and artist_id is None:
-        return None
+        return [], []
 
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    shows = []
+    now = datetime.now()
+    upcoming = case([(MusicShow.start_time > now, True)], else_=False)
     if venue_id is not None:
-        if upcoming:
-            shows = (
-                db.session.query(
-                    MusicShow.start_time.label("start_time"),
-                    Artist.id.label("artist_id"),
-                    Artist.name.label("artist_name"),
-                    Artist.image_link.label("artist_image_link"),
-                )
-                .join(Venue)
-                .join(Artist)
-                .filter(Venue.id == venue_id)
-                .filter(MusicShow.start_time > now)
-                .all()
+        query = (
+            db.session.query(
+                MusicShow.start_time.label("start_time"),
+                MusicShow.artist_id.label("artist_id"),
+                Artist.name.label("artist_name"),
+                Artist.image_link.label("artist_image_link"),
+                upcoming.label("upcoming"),
             )
-
-        else:
-            shows = (
-                db.session.query(
-                    MusicShow.start_time.label("start_time"),
-                    Artist.id.label("artist_id"),
-                    Artist.name.label("artist_name"),
-                    Artist.image_link.label("artist_image_link"),
-                )
-                .join(Venue)
-                .join(Artist)
-                .filter(Venue.id == venue_id)
-                .filter(MusicShow.start_time < now)
-                .all()
+            .join(Artist, MusicShow.artist_id == Artist.id)
+            .filter(MusicShow.venue_id == venue_id)
+        )
+    else:
+        query = (
+            db.session.query(
+                MusicShow.start_time.label("start_time"),
+                MusicShow.venue_id.label("venue_id"),
+                Venue.name.label("venue_name"),
+                Venue.image_link.label("venue_image_link"),
+                upcoming.label("upcoming"),
             )
+            .join(Venue, MusicShow.venue_id == Venue.id)
+            .filter(MusicShow.artist_id == artist_id)
+        )
 
-    elif artist_id is not None:
-        if upcoming:
-            shows = (
-                db.session.query(
-                    MusicShow.start_time.label("start_time"),
-                    Venue.id.label("venue_id"),
-                    Venue.name.label("venue_name"),
-                    Venue.image_link.label("venue_image_link"),
-                )
-                .join(Artist)
-                .join(Venue)
-                .filter(Artist.id == artist_id)
-                .filter(MusicShow.start_time > now)
-                .all()
-            )
+    lower_bound = None if entity is None else show_lower_bound(entity)
+    if lower_bound is not None:
+        query = query.filter(MusicShow.start_time >= lower_bound)
 
+    past_shows = []
+    upcoming_shows = []
+    shows = (
+        query.filter(MusicShow.start_time.isnot(None))
+        .order_by(MusicShow.start_time)
+        .all()
+    )
+    for show in shows:
+        if show.upcoming:
+            upcoming_shows.append(show)
         else:
-            shows = (
-                db.session.query(
-                    MusicShow.start_time.label("start_time"),
-                    Venue.id.label("venue_id"),
-                    Venue.name.label("venue_name"),
-                    Venue.image_link.label("venue_image_link"),
-                )
-                .join(Artist)
-                .join(Venue)
-                .filter(Artist.id == artist_id)
-                .filter(MusicShow.start_time < now)
-                .all()
-            )
-    return shows
-
-
-@app.route("/venues/<int:venue_id>")
-def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    # DONE: replace with real venue data from the venues table, using venue_id
+            past_shows.append(show)
+    return past_shows, upcoming_shows
 
-    venue = Venue.query.get(venue_id)
-    past_shows = find_shows(venue_id=venue_id, upcoming=False)
-    upcoming_shows = find_shows(venue_id=venue_id, upcoming=True)
 
-    data = {
+def venue_page(venue, past_shows, upcoming_shows):
+    # Context of pages/show_venue.html, also rendered by the asyncio path of
+    # asgi.py from the rows it fetched itself.
+    return {
         "id": venue.id,
         "name": venue.name,
         "genres": venue.genres,
@@ -215,6 +397,104 @@ def show_venue(venue_id):
         "upcoming_shows_count": len(upcoming_shows),
     }
 
+
+def artist_page(artist, past_shows, upcoming_shows):
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "seeking_venue": False,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+
+def date_arg(name):
+    # The date in request argument name, None when it is missing or empty.
+    # dateutil raises OverflowError for numbers out of range, e.g. 99999999999.
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return dateutil.parser.parse(value)
+    except (OverflowError, ValueError):
+        abort(400)
+
+
+@main.route("/venues/available")
+@db.read_only
+@page_cache.cached("venues")
+def available_venues_page():
+    # /venues/available?city=Austin&from=2026-10-23T20:00&to=2026-10-23T23:00
+    city = request.args.get("city", "").strip()
+    start = date_arg("from")
+    end = date_arg("to")
+    if start is None or end is None or end <= start:
+        abort(400)
+    data = available_venues(start, end, city).all()
+    return render_template(
+        "pages/available_venues.html",
+        venues=data,
+        city=city,
+        start=start,
+        end=end,
+    )
+
+
+@main.route("/venues/near")
+@db.read_only
+def venues_near():
+    # /venues/near?lat=30.27&lng=-97.74&radius=10, or near a gazetteer city
+    # with /venues/near?city=Austin&state=TX.
+    config = current_app.config
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    city = request.args.get("city", "").strip()
+    state = request.args.get("state", "").strip()
+    if (lat is None or lng is None) and city:
+        lat, lng = locate(city, state) or (None, None)
+    radius = request.args.get("radius", config["NEAR_RADIUS"], type=float)
+    limit = request.args.get("limit", config["NEAR_LIMIT"], type=int)
+    if (
+        lat is None
+        or lng is None
+        or not -90 <= lat <= 90
+        or not -180 <= lng <= 180
+        or not 0 < radius <= config["NEAR_MAX_RADIUS"]
+    ):
+        abort(400)
+    limit = min(max(limit, 1), config["NEAR_MAX_LIMIT"])
+    data = venue_locator.nearest(lat, lng, radius, limit)
+    return render_template(
+        "pages/venues_near.html",
+        venues=data,
+        lat=lat,
+        lng=lng,
+        city=city,
+        state=state,
+        radius=radius,
+    )
+
+
+@main.route("/venues/<int:venue_id>")
+@db.read_only
+@page_cache.cached("venue:{venue_id}")
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # DONE: replace with real venue data from the venues table, using venue_id
+
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        abort(404)
+    past_shows, upcoming_shows = find_shows(venue_id=venue_id, entity=venue)
+    data = venue_page(venue, past_shows, upcoming_shows)
+
     return render_template("pages/show_venue.html", venue=data)
 
 
@@ -222,13 +502,13 @@ def show_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route("/venues/create", methods=["GET"])
+@main.route("/venues/create", methods=["GET"])
 def create_venue_form():
     form = VenueForm()
     return render_template("forms/new_venue.html", form=form)
 
 
-@app.route("/venues/create", methods=["POST"])
+@main.route("/venues/create", methods=["POST"])
 def create_venue_submission():
     # DONE: implement genres to take multiple string objects
 
@@ -247,8 +527,10 @@ def create_venue_submission():
             image_link=req_body["image_link"],
             facebook_link=req_body["facebook_link"],
         )
+        geocode(new_venue)
         db.session.add(new_venue)
         db.session.commit()
+        venue_changed(new_venue)
 
         data["name"] = new_venue.name
     except Exception:
@@ -270,7 +552,7 @@ def create_venue_submission():
     return render_template("pages/home.html")
 
 
-@app.route("/venues/<venue_id>", methods=["DELETE"])
+@main.route("/venues/<venue_id>", methods=["DELETE"])
 def delete_venue(venue_id):
     # DONE: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session
@@ -281,28 +563,47 @@ def delete_venue(venue_id):
     # redirect the user to the homepage
 
     error = False
+    job_id = None
     try:
-        Venue.query.filter_by(id=venue_id).delete()
-        db.session.commit()
+        # The venue goes with its shows, in batches in the background when it
+        # has many, see deletions.py.
+        job_id = deleter.delete("venue", venue_id)
     except Exception:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
 
-    return redirect(url_for("index"))
+    if job_id is not None:
+        return deletion_accepted(job_id)
+    return redirect(url_for(".index"))
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route("/artists")
+@main.route("/artists")
+@db.read_only
+@page_cache.cached("artists")
 def artists():
     # DONE: replace with real data returned from querying the database
-    data = Artist.query.all()
-    return render_template("pages/artists.html", artists=data)
+    filters = parse_filters(request.args)
+    if filters is None:
+        abort(400)
+    data = (
+        db.session.query(Artist.id, Artist.name)
+        .filter(*filter_conditions(Artist, filters))
+        .yield_per(100)
+    )
+    return render_streamed(
+        "pages/artists.html",
+        artists=data,
+        filters=filters,
+        genres=genre_facets(Artist),
+    )
 
 
-@app.route("/artists/search", methods=["POST"])
+@main.route("/artists/search", methods=["POST"])
+@db.read_only
 def search_artists():
     # DONE: implement search on artists with partial string search.
     # Ensure it is case-insensitive.
@@ -310,21 +611,19 @@ def search_artists():
     # and "The Wild Sax Band".
     # Search for "band" should return "The Wild Sax Band".
 
-    search_term = request.form.get("search_term")
-    artists = Artist.query.filter(Artist.name.ilike("%" + search_term + "%")).all()
-    data = []
-    for artist in artists:
-        data.append({"id": artist.id, "name": artist.name})
-
+    search_term = request.form.get("search_term", "")
+    data = artist_search.search(
+        search_term, limit=current_app.config["SEARCH_RESULT_LIMIT"]
+    )
     response = {"count": len(data), "data": data}
     return render_template(
         "pages/search_artists.html",
         results=response,
-        search_term=request.form.get("search_term", ""),
+        search_term=search_term,
     )
 
 
-@app.route("/artists/<artist_id>", methods=["DELETE"])
+@main.route("/artists/<artist_id>", methods=["DELETE"])
 def delete_artist(artist_id):
     # DONE: Complete this endpoint for taking a artist_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session
@@ -335,48 +634,67 @@ def delete_artist(artist_id):
     # redirect the user to the homepage
 
     error = False
+    job_id = None
     try:
-        Artist.query.filter_by(id=artist_id).delete()
-        db.session.commit()
+        job_id = deleter.delete("artist", artist_id)
     except Exception:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
 
-    return redirect(url_for("index"))
+    if job_id is not None:
+        return deletion_accepted(job_id)
+    return redirect(url_for(".index"))
+
+
+#  Deletions
+#  ----------------------------------------------------------------
+
+
+def deletion_accepted(job_id):
+    url = url_for(".deletion_status", job_id=job_id)
+    response = jsonify(id=job_id, status_url=url)
+    response.status_code = 202
+    response.headers["Location"] = url
+    return response
+
+
+@main.route("/deletions/<int:job_id>")
+def deletion_status(job_id):
+    job = DeletionJob.query.get_or_404(job_id)
+    return jsonify(
+        id=job.id,
+        entity=job.entity,
+        entity_id=job.entity_id,
+        status=job.status,
+        show_count=job.show_count,
+        shows_deleted=job.shows_deleted,
+        error=job.error,
+        created_at=job.created_at.isoformat(),
+        finished_at=job.finished_at and job.finished_at.isoformat(),
+    )
 
 
-@app.route("/artists/<int:artist_id>")
+@main.route("/artists/<int:artist_id>")
+@db.read_only
+@page_cache.cached("artist:{artist_id}")
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # DONE: replace with real venue data from the venues table, using venue_id
 
     artist = Artist.query.get(artist_id)
-    past_shows = find_shows(artist_id=artist_id, upcoming=False)
-    upcoming_shows = find_shows(artist_id=artist_id, upcoming=True)
-
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres,
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "seeking_venue": False,
-        "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
+    if artist is None:
+        abort(404)
+    past_shows, upcoming_shows = find_shows(artist_id=artist_id, entity=artist)
+    data = artist_page(artist, past_shows, upcoming_shows)
 
     return render_template("pages/show_artist.html", artist=data)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route("/artists/<int:artist_id>/edit", methods=["GET"])
+@main.route("/artists/<int:artist_id>/edit", methods=["GET"])
 def edit_artist(artist_id):
     artist = Artist.query.get(artist_id)
     # DONE: populate form with fields from artist with ID <artist_id>
@@ -384,7 +702,7 @@ def edit_artist(artist_id):
     return render_template("forms/edit_artist.html", form=form, artist=artist)
 
 
-@app.route("/artists/<int:artist_id>/edit", methods=["POST"])
+@main.route("/artists/<int:artist_id>/edit", methods=["POST"])
 def edit_artist_submission(artist_id):
     # DONE: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
@@ -405,16 +723,17 @@ def edit_artist_submission(artist_id):
         artist.facebook_link = req_body["facebook_link"]
 
         db.session.commit()
+        artist_changed(artist)
     except Exception:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
 
-    return redirect(url_for("show_artist", artist_id=artist_id))
+    return redirect(url_for(".show_artist", artist_id=artist_id))
 
 
-@app.route("/venues/<int:venue_id>/edit", methods=["GET"])
+@main.route("/venues/<int:venue_id>/edit", methods=["GET"])
 def edit_venue(venue_id):
     venue = Venue.query.get(venue_id)
     form = VenueForm(obj=venue)
@@ -423,7 +742,7 @@ def edit_venue(venue_id):
     return render_template("forms/edit_venue.html", form=form, venue=venue)
 
 
-@app.route("/venues/<int:venue_id>/edit", methods=["POST"])
+@main.route("/venues/<int:venue_id>/edit", methods=["POST"])
 def edit_venue_submission(venue_id):
     # DONE: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
@@ -432,6 +751,8 @@ def edit_venue_submission(venue_id):
         req_body = request.form
 
         venue = Venue.query.get(venue_id)
+        if (venue.city, venue.state) != (req_body["city"], req_body["state"]):
+            venue.latitude = venue.longitude = None
         venue.name = req_body["name"]
         venue.city = req_body["city"]
         venue.state = req_body["state"]
@@ -440,28 +761,30 @@ def edit_venue_submission(venue_id):
         venue.genres = req_body.getlist("genres")
         venue.image_link = req_body["image_link"]
         venue.facebook_link = req_body["facebook_link"]
+        geocode(venue)
 
         db.session.commit()
+        venue_changed(venue)
     except Exception:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
 
-    return redirect(url_for("show_venue", venue_id=venue_id))
+    return redirect(url_for(".show_venue", venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route("/artists/create", methods=["GET"])
+@main.route("/artists/create", methods=["GET"])
 def create_artist_form():
     form = ArtistForm()
     return render_template("forms/new_artist.html", form=form)
 
 
-@app.route("/artists/create", methods=["POST"])
+@main.route("/artists/create", methods=["POST"])
 def create_artist_submission():
     # DONE: implement genres to take multiple string objects
 
@@ -484,6 +807,7 @@ def create_artist_submission():
         new_artist_name = new_artist.name
         db.session.add(new_artist)
         db.session.commit()
+        artist_changed(new_artist)
     except Exception:
         error = True
         db.session.rollback()
@@ -509,56 +833,122 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 
-@app.route("/shows")
+def parse_show_cursor(cursor):
+    # Cursors have the form "<start_time isoformat>_<show id>".
+    start_time, _, show_id = cursor.rpartition("_")
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+def make_show_cursor(show):
+    return "{}_{}".format(show.start_time.isoformat(), show.id)
+
+
+@main.route("/shows")
+@db.read_only
+@page_cache.cached("shows")
 def shows():
     # displays list of shows at /shows
     # DONE: replace with real venues data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
-    shows = MusicShow.query.all()
-    data = []
-    for i in range(len(shows)):
-        new_show = {
-            "venue_id": shows[i].venue_id,
-            "venue_name": shows[i].venue.name,
-            "artist_id": shows[i].artist_id,
-            "artist_name": shows[i].artist.name,
-            "artist_image_link": shows[i].artist.image_link,
-            "start_time": shows[i].start_time,
-        }
-        data.append(new_show)
-
-    return render_template("pages/shows.html", shows=data)
-
-
-@app.route("/shows/create")
+    per_page = current_app.config["SHOWS_PER_PAGE"]
+    upcoming = request.args.get("upcoming") == "1"
+    date_from = date_arg("from")
+    date_to = date_arg("to")
+    cursor = request.args.get("after", type=parse_show_cursor)
+
+    # Shows are paged with a keyset on (start_time, id) so every page is an
+    # index range scan, whatever its position in the feed.
+    query = (
+        db.session.query(
+            MusicShow.id,
+            MusicShow.start_time,
+            MusicShow.venue_id,
+            Venue.name.label("venue_name"),
+            MusicShow.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, MusicShow.venue_id == Venue.id)
+        .join(Artist, MusicShow.artist_id == Artist.id)
+        .filter(MusicShow.start_time.isnot(None))
+    )
+    if upcoming:
+        query = query.filter(MusicShow.start_time > datetime.now())
+    if date_from is not None:
+        query = query.filter(MusicShow.start_time >= date_from)
+    if date_to is not None:
+        query = query.filter(MusicShow.start_time < date_to)
+    if cursor is not None:
+        start_time, show_id = cursor
+        # The plain lower bound lets Postgres skip the earlier partitions.
+        query = query.filter(
+            MusicShow.start_time >= start_time,
+            or_(MusicShow.start_time > start_time, MusicShow.id > show_id),
+        )
+    data = query.order_by(MusicShow.start_time, MusicShow.id).limit(per_page + 1)
+
+    filters = {
+        key: value
+        for key, value in request.args.items()
+        if key in ("upcoming", "from", "to")
+    }
+    return render_streamed(
+        "pages/shows.html",
+        shows=Page(data, per_page),
+        filters=filters,
+        show_cursor=make_show_cursor,
+    )
+
+
+@main.route("/shows/create")
 def create_shows():
     # renders form. do not touch.
-    form = ShowForm()
+    form = ShowForm(duration=current_app.config["SHOW_DEFAULT_DURATION"])
     return render_template("forms/new_show.html", form=form)
 
 
-@app.route("/shows/create", methods=["POST"])
+@main.route("/shows/create", methods=["POST"])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # DONE: insert form data as a new Show record in the db, instead
     error = False
+    conflict = False
     req_body = request.form
+    try:
+        start_time = dateutil.parser.parse(req_body["start_time"])
+    except (OverflowError, ValueError):
+        flash("Invalid start time. Show could not be listed.")
+        return render_template("pages/home.html"), 400
 
     try:
+        minutes = req_body.get(
+            "duration", current_app.config["SHOW_DEFAULT_DURATION"], type=int
+        )
+        if not 0 < minutes <= current_app.config["SHOW_MAX_DURATION"]:
+            raise ValueError("Invalid duration: {}".format(minutes))
+        # Rejected here when the venue is already booked at that time.
+        book(int(req_body["venue_id"]), start_time, timedelta(minutes=minutes))
         new_show = MusicShow(
             artist_id=req_body["artist_id"],
             venue_id=req_body["venue_id"],
-            start_time=req_body["start_time"],
+            start_time=start_time,
         )
         db.session.add(new_show)
+        count_show(new_show.venue_id, new_show.artist_id, new_show.start_time)
         db.session.commit()
+        show_added(new_show)
+    except BookingConflict:
+        conflict = True
+        db.session.rollback()
     except Exception:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
 
-    if error:
+    if conflict:
+        flash("The venue is already booked at that time. Show could not be listed.")
+    elif error:
         # DONE: on unsuccessful db insert, flash an error instead.
         flash("An error occurred. Show could not be listed.")
     else:
@@ -568,35 +958,109 @@ def create_show_submission():
     return render_template("pages/home.html")
 
 
-@app.errorhandler(404)
+def bulk_show_row(line):
+    # "artist, venue, start time[, duration]", the artist and the venue by id
+    # or by name.
+    fields = [field.strip() for field in next(csv.reader([line]), [])]
+    row = {}
+    for key, value in zip(("artist", "venue"), fields):
+        row[key + ("_id" if value.isdigit() else "_name")] = value
+    if len(fields) > 2:
+        row["start_time"] = fields[2]
+    if len(fields) > 3:
+        row["duration"] = fields[3]
+    return row
+
+
+@main.route("/shows/bulk")
+def create_shows_bulk():
+    return render_template("forms/new_shows.html", form=BulkShowForm(), errors=[])
+
+
+@main.route("/shows/bulk", methods=["POST"])
+def create_shows_bulk_submission():
+    lines = [
+        line for line in request.form.get("shows", "").splitlines() if line.strip()
+    ]
+    limit = current_app.config["BULK_SHOWS_MAX"]
+    if not 0 < len(lines) <= limit:
+        flash("List from 1 to {} shows, one per line.".format(limit))
+        return render_template("forms/new_shows.html", form=BulkShowForm(), errors=[])
+
+    try:
+        created, errors = add_shows([bulk_show_row(line) for line in lines])
+    except Exception:
+        db.session.rollback()
+        flash("An error occurred. Shows could not be listed.")
+        return render_template("forms/new_shows.html", form=BulkShowForm(), errors=[])
+    finally:
+        db.session.close()
+
+    if created:
+        flash("{} shows were successfully listed!".format(len(created)))
+    if not errors:
+        return render_template("pages/home.html")
+    # The rejected lines are left in the form to be corrected.
+    flash("{} shows could not be listed.".format(len(errors)))
+    form = BulkShowForm(
+        formdata=None, shows="\n".join(lines[number - 1] for number, _ in errors)
+    )
+    errors = [(number, lines[number - 1], error) for number, error in errors]
+    return render_template("forms/new_shows.html", form=form, errors=errors)
+
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+
+@main.route("/api/autocomplete")
+def autocomplete_names():
+    kind = request.args.get("type")
+    if kind not in (None, "venue", "artist"):
+        abort(400)
+    limit = min(
+        request.args.get("limit", current_app.config["AUTOCOMPLETE_LIMIT"], type=int),
+        current_app.config["AUTOCOMPLETE_MAX_LIMIT"],
+    )
+    data = autocomplete.search(request.args.get("q", ""), max(limit, 0), kind=kind)
+    return jsonify({"count": len(data), "data": data})
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+
+@main.route("/export/shows.<file_format>")
+def export_shows_file(file_format):
+    if file_format not in FORMATS:
+        abort(404)
+    if not export_authorized():
+        abort(401)
+
+    compress = request.args.get("gzip") == "1"
+    response = Response(
+        stream_with_context(export_shows(file_format, compress)),
+        mimetype=FORMATS[file_format][1],
+    )
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template("errors/404.html"), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template("errors/500.html"), 500
 
 
-if not app.debug:
-    file_handler = FileHandler("error.log")
-    file_handler.setFormatter(
-        Formatter("%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]")
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info("errors")
-
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
 
-# Default port:
-# if __name__ == '__main__':
-#     app.run()
-
-# Or specify port manually:
-
+# Development server only, production runs wsgi.py under gunicorn (run.sh).
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=80)
+    create_app().run()
@@ -0,0 +1,234 @@
+"""Optional asyncio entry point, served by an ASGI server:
+
+    pip install uvicorn asgiref asyncpg  # aiosqlite instead of asyncpg for SQLite
+    uvicorn --factory asgi:create_asgi_app --workers 4
+
+The venue and artist pages are rendered here from three queries run
+concurrently on an async driver: the entity, its past shows and its upcoming
+shows. Their templates are rendered in a thread, off the event loop. Every
+other request, and detail pages carrying a flashed message, is handed to the
+Flask application in a thread.
+
+None of these packages are in requirements.txt: only this entry point needs
+them.
+"""
+
+import asyncio
+import importlib
+import json
+import os
+import re
+from datetime import datetime
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from flask import render_template, session
+
+from app import artist_page, create_app, venue_page
+
+DETAIL_PATH = re.compile(r"^/(venues|artists)/(\d+)$")
+
+ENTITY_SQL = {
+    "venues": "SELECT id, name, genres, address, city, state, phone, website, "
+    "facebook_link, image_link FROM venue WHERE id = ?",
+    "artists": "SELECT id, name, genres, city, state, phone, image_link, "
+    "facebook_link, seeking_venue, seeking_description FROM artist WHERE id = ?",
+}
+# The same split as find_shows: upcoming once start_time is after now.
+SHOWS_SQL = {
+    "venues": "SELECT s.start_time, s.artist_id, a.name AS artist_name, "
+    "a.image_link AS artist_image_link FROM music_show s "
+    "JOIN artist a ON a.id = s.artist_id "
+    "WHERE s.venue_id = ? AND s.start_time {} ? ORDER BY s.start_time",
+    "artists": "SELECT s.start_time, s.venue_id, v.name AS venue_name, "
+    "v.image_link AS venue_image_link FROM music_show s "
+    "JOIN venue v ON v.id = s.venue_id "
+    "WHERE s.artist_id = ? AND s.start_time {} ? ORDER BY s.start_time",
+}
+
+
+def require(module):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise RuntimeError(
+            "asgi.py needs the {} package: pip install uvicorn asgiref "
+            "asyncpg, or aiosqlite instead of asyncpg for SQLite.".format(
+                module.split(".")[0]
+            )
+        )
+
+
+class PostgresDatabase:
+    def __init__(self, url, pool_size):
+        self.asyncpg = require("asyncpg")
+        self.url = url
+        self.pool_size = pool_size
+        self.pool = None
+
+    async def connect(self):
+        self.pool = await self.asyncpg.create_pool(
+            self.url, min_size=1, max_size=self.pool_size
+        )
+
+    async def fetch(self, sql, *params):
+        # asyncpg numbers its placeholders.
+        count = iter(range(1, sql.count("?") + 1))
+        sql = re.sub(r"\?", lambda match: "${}".format(next(count)), sql)
+        async with self.pool.acquire() as connection:
+            return [dict(row) for row in await connection.fetch(sql, *params)]
+
+    async def close(self):
+        await self.pool.close()
+
+
+class SQLiteDatabase:
+    # SQLAlchemy stores SQLite datetimes as text and genres as JSON.
+    DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+    def __init__(self, path, pool_size):
+        self.aiosqlite = require("aiosqlite")
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = asyncio.Queue()
+
+    async def connect(self):
+        for _ in range(self.pool_size):
+            connection = await self.aiosqlite.connect(self.path)
+            connection.row_factory = self.aiosqlite.Row
+            self.pool.put_nowait(connection)
+
+    async def fetch(self, sql, *params):
+        params = [
+            value.strftime(self.DATETIME_FORMAT)
+            if isinstance(value, datetime)
+            else value
+            for value in params
+        ]
+        connection = await self.pool.get()
+        try:
+            async with connection.execute(sql, params) as cursor:
+                rows = [dict(row) for row in await cursor.fetchall()]
+        finally:
+            self.pool.put_nowait(connection)
+        for row in rows:
+            if isinstance(row.get("start_time"), str):
+                row["start_time"] = datetime.fromisoformat(row["start_time"])
+            if isinstance(row.get("genres"), str):
+                row["genres"] = json.loads(row["genres"])
+        return rows
+
+    async def close(self):
+        while not self.pool.empty():
+            await self.pool.get_nowait().close()
+
+
+def async_database(url, pool_size, root_path):
+    scheme = urlsplit(url).scheme.split("+")[0]
+    if scheme in ("postgres", "postgresql"):
+        return PostgresDatabase("postgresql" + url[url.index(":") :], pool_size)
+    if scheme == "sqlite":
+        # Relative paths are resolved like Flask-SQLAlchemy does.
+        path = os.path.join(root_path, url[len("sqlite:///") :])
+        return SQLiteDatabase(path, pool_size)
+    raise ValueError("No async driver for {}".format(url))
+
+
+class AsyncDetailPages:
+    """ASGI application rendering the detail pages with concurrent queries.
+
+    The queries always go to the primary, so these pages are neither routed
+    to the replicas nor cached. Every other request goes to the Flask app.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = require("asgiref.wsgi").WsgiToAsgi(flask_app)
+        self.database = None
+        self._connecting = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "GET":
+            match = DETAIL_PATH.match(scope["path"])
+            if match is not None:
+                kind, entity_id = match.group(1), int(match.group(2))
+                page = await self.detail_page(scope, kind, entity_id)
+                if page is not None:
+                    return await self.respond(send, *page)
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.database is not None:
+                    await self.database.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def connect(self):
+        async with self._connecting:
+            if self.database is None:
+                config = self.flask_app.config
+                database = async_database(
+                    config["SQLALCHEMY_DATABASE_URI"],
+                    config["DATABASE_POOL_SIZE"],
+                    self.flask_app.root_path,
+                )
+                await database.connect()
+                self.database = database
+        return self.database
+
+    async def detail_page(self, scope, kind, entity_id):
+        database = self.database or await self.connect()
+        now = datetime.now()
+        entities, past_shows, upcoming_shows = await asyncio.gather(
+            database.fetch(ENTITY_SQL[kind], entity_id),
+            database.fetch(SHOWS_SQL[kind].format("<="), entity_id, now),
+            database.fetch(SHOWS_SQL[kind].format(">"), entity_id, now),
+        )
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.render, scope, kind, entities, past_shows, upcoming_shows
+        )
+
+    def render(self, scope, kind, entities, past_shows, upcoming_shows):
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope["headers"]
+        ]
+        with self.flask_app.test_request_context(
+            scope["path"], query_string=scope["query_string"], headers=headers
+        ):
+            # Flashed messages must be consumed by the session-aware Flask app.
+            if "_flashes" in session:
+                return None
+            if not entities:
+                return 404, render_template("errors/404.html")
+            entity = SimpleNamespace(**entities[0])
+            if kind == "venues":
+                data = venue_page(entity, past_shows, upcoming_shows)
+                return 200, render_template("pages/show_venue.html", venue=data)
+            data = artist_page(entity, past_shows, upcoming_shows)
+            return 200, render_template("pages/show_artist.html", artist=data)
+
+    async def respond(self, send, status, body):
+        body = body.encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"text/html; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_asgi_app(config="config.ProductionConfig"):
+    return AsyncDetailPages(create_app(config))
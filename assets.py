@@ -0,0 +1,268 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# `flask build-assets` concatenates the bundles below, and copies them with
+# every other file under static/ to static/dist/ with the hash of their content
+# in their name, precompressed to gzip and, with the brotli package, brotli.
+# With ASSETS_BUNDLED set the templates link to those through the manifest:
+# url_for("static", filename="img/front-splash.jpg") gives the fingerprinted
+# path, and asset_urls("css/app.css") the bundle. These are served with their
+# precompressed variant and cached for good by the browsers. Otherwise the
+# sources are linked one by one, as they are.
+
+DIST = "dist"
+MANIFEST = posixpath.join(DIST, "manifest.json")
+
+BUNDLES = {
+    "css/app.css": [
+        "css/bootstrap.min.css",
+        "css/layout.main.css",
+        "css/main.css",
+        "css/main.responsive.css",
+        "css/main.quickfix.css",
+    ],
+    # Deferred, nothing runs before the page is parsed.
+    "js/app.js": [
+        "js/libs/jquery-1.11.1.min.js",
+        "js/libs/bootstrap-3.1.1.min.js",
+        "js/libs/moment.min.js",
+        "js/plugins.js",
+        "js/script.js",
+    ],
+}
+
+COMPRESSIBLE = {".css", ".js", ".map", ".svg", ".eot", ".ttf", ".otf", ".json"}
+MIN_COMPRESS_SIZE = 1024
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+CSS_COMMENT = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*(?!!)[\s\S]*?\*/"""
+)
+SOURCE_MAP = re.compile(r"^\s*//[#@] sourceMappingURL=.*$", re.MULTILINE)
+
+
+def fingerprint(path, content):
+    digest = hashlib.md5(content).hexdigest()[:12]
+    root, extension = posixpath.splitext(path)
+    return posixpath.join(DIST, "{}.{}{}".format(root, digest, extension))
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    # Comments and blank space only, strings left alone.
+    text = CSS_COMMENT.sub(lambda match: match.group(1) or "", text)
+    return re.sub(r"\s*\n\s*", "\n", text).strip()
+
+
+def minify_js(path, text):
+    if rjsmin is not None and not path.endswith(".min.js"):
+        return rjsmin.jsmin(text)
+    return text
+
+
+def rewrite_css_urls(text, source, target, manifest):
+    # Relative urls are resolved from the source stylesheet, then pointed at
+    # the fingerprinted file from the location of the built one.
+    def replace(match):
+        url = match.group(2)
+        if re.match(r"^(?:[a-z]+:|/|#)", url):
+            return match.group(0)
+        path = re.split(r"[?#]", url, 1)[0]
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        built = manifest.get(resolved, resolved)
+        relative = posixpath.relpath(built, posixpath.dirname(target))
+        return 'url("{}")'.format(relative + url[len(path) :])
+
+    return CSS_URL.sub(replace, text)
+
+
+def compress(folder, path):
+    # Writes path.gz and path.br next to path where they are worth it.
+    with open(os.path.join(folder, path), "rb") as stream:
+        content = stream.read()
+    encodings = []
+    if len(content) < MIN_COMPRESS_SIZE:
+        return encodings
+    variants = [("gzip", ".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ("br", ".br", lambda data: brotli.compress(data)))
+    for encoding, suffix, compressor in variants:
+        compressed = compressor(content)
+        if len(compressed) < len(content):
+            with open(os.path.join(folder, path + suffix), "wb") as stream:
+                stream.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build(folder):
+    """Build static/dist from the static folder and return its manifest."""
+    shutil.rmtree(os.path.join(folder, DIST), ignore_errors=True)
+    sources = []
+    for root, directories, files in os.walk(folder):
+        directories[:] = [name for name in directories if name != DIST]
+        for name in files:
+            if not name.startswith("."):
+                path = os.path.relpath(os.path.join(root, name), folder)
+                sources.append(path.replace(os.sep, "/"))
+
+    files = {}
+    encodings = {}
+
+    def write(path, content):
+        target = fingerprint(path, content)
+        os.makedirs(os.path.dirname(os.path.join(folder, target)), exist_ok=True)
+        with open(os.path.join(folder, target), "wb") as stream:
+            stream.write(content)
+        encodings[target] = []
+        if posixpath.splitext(path)[1] in COMPRESSIBLE:
+            encodings[target] = compress(folder, target)
+        files[path] = target
+
+    def read(path):
+        with open(os.path.join(folder, path), encoding="utf-8") as stream:
+            return stream.read()
+
+    # Stylesheets last, their urls pointing at the other files.
+    for path in sorted(sources, key=lambda path: path.endswith(".css")):
+        if not path.endswith(".css"):
+            with open(os.path.join(folder, path), "rb") as stream:
+                write(path, stream.read())
+            continue
+        text = rewrite_css_urls(read(path), path, fingerprint(path, b""), files)
+        write(path, text.encode("utf-8"))
+
+    for bundle, paths in BUNDLES.items():
+        if bundle.endswith(".css"):
+            target = fingerprint(bundle, b"")
+            parts = [
+                minify_css(rewrite_css_urls(read(path), path, target, files))
+                for path in paths
+            ]
+            write(bundle, "\n".join(parts).encode("utf-8"))
+        else:
+            parts = [SOURCE_MAP.sub("", minify_js(path, read(path))) for path in paths]
+            write(bundle, ";\n".join(part.strip() for part in parts).encode("utf-8"))
+
+    manifest = {"files": files, "encodings": encodings}
+    with open(os.path.join(folder, MANIFEST), "w") as stream:
+        json.dump(manifest, stream, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.files = {}
+        self.encodings = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["assets"] = self
+        self.files = {}
+        self.encodings = {}
+        app.url_defaults(self.fingerprinted)
+        app.context_processor(lambda: {"asset_urls": self.asset_urls})
+        if not app.config["ASSETS_BUNDLED"]:
+            return
+        path = os.path.join(app.static_folder, MANIFEST)
+        if not os.path.exists(path):
+            app.logger.warning("No %s, run flask build-assets.", path)
+            return
+        with open(path) as stream:
+            manifest = json.load(stream)
+        self.files = manifest["files"]
+        self.encodings = manifest["encodings"]
+        app.view_functions["static"] = self.send_static_file
+
+    def fingerprinted(self, endpoint, values):
+        if endpoint == "static" and values.get("filename") in self.files:
+            values["filename"] = self.files[values["filename"]]
+
+    def asset_urls(self, bundle):
+        """The urls of a bundle, or of its sources when it is not built."""
+        if bundle in self.files:
+            return [url_for("static", filename=bundle)]
+        return [url_for("static", filename=path) for path in BUNDLES[bundle]]
+
+    def send_static_file(self, filename):
+        app = current_app
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            return app.send_static_file(filename)
+        # Fingerprinted files never change: cached for good, in the best
+        # encoding the client accepts.
+        max_age = app.config["ASSETS_MAX_AGE"]
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding in encodings and encoding in request.accept_encodings:
+                response = send_from_directory(
+                    app.static_folder,
+                    filename + suffix,
+                    mimetype=mimetype,
+                    cache_timeout=max_age,
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(
+                app.static_folder, filename, cache_timeout=max_age
+            )
+        response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = "public, max-age={}, immutable".format(
+            max_age
+        )
+        return response
+
+
+assets = Assets()
+
+
+@click.command("build-assets")
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress static/ into static/dist.
+
+    Run it at deploy time, before starting the workers.
+    """
+    folder = current_app.static_folder
+    manifest = build(folder)
+    for bundle in BUNDLES:
+        target = manifest["files"][bundle]
+        sizes = [os.path.getsize(os.path.join(folder, target))]
+        for encoding in manifest["encodings"][target]:
+            suffix = ".br" if encoding == "br" else ".gz"
+            sizes.append(os.path.getsize(os.path.join(folder, target + suffix)))
+        click.echo(
+            "{} -> {} ({})".format(
+                bundle, target, ", ".join("{} bytes".format(size) for size in sizes)
+            )
+        )
+    if brotli is None:
+        click.echo("brotli is not installed, only gzip variants were written.")
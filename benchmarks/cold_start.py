@@ -0,0 +1,122 @@
+"""First request latency of a new worker, with and without the template caches.
+
+Every run starts a new process, which creates the application and requests
+each page once, as a worker does after a restart. Runs are made without the
+bytecode cache, with the bytecode cache filled by `flask compile-templates`,
+and with either of them plus the warm-up that loads TEMPLATE_PRELOAD before
+the first request. The warm-up time is spent before the worker accepts
+requests and reported separately.
+
+    python -m benchmarks.cold_start [--runs 5]
+"""
+
+import argparse
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.routes import percentile
+
+PAGES = ["/", "/venues", "/artists", "/shows", "/venues/1", "/artists/1"]
+
+MODES = [
+    ("compiled", False, False),
+    ("compiled + warm-up", False, True),
+    ("bytecode cache", True, False),
+    ("bytecode cache + warm-up", True, True),
+]
+
+
+def child(preload):
+    from app import create_app
+    from cache import page_cache
+    from templating import template_cache
+
+    app = create_app()
+    page_cache.enabled = False
+    warm_up_ms = 0.0
+    if preload:
+        started = time.perf_counter()
+        with app.app_context():
+            template_cache.preload(app)
+        warm_up_ms = (time.perf_counter() - started) * 1000
+
+    client = app.test_client()
+    latencies = []
+    for page in PAGES:
+        started = time.perf_counter()
+        response = client.get(page)
+        response.get_data()
+        assert response.status_code == 200, (page, response.status_code)
+        latencies.append((time.perf_counter() - started) * 1000)
+    json.dump({"warm_up_ms": warm_up_ms, "latencies": latencies}, sys.stdout)
+
+
+def run(environ, preload):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.cold_start", "--child"]
+        + (["--preload"] if preload else []),
+        env=environ,
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--preload", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.preload)
+
+    handle, path = tempfile.mkstemp(suffix=".db", prefix="fyyur-bench-")
+    os.close(handle)
+    atexit.register(os.remove, path)
+    cache_dir = tempfile.mkdtemp(prefix="fyyur-templates-")
+    atexit.register(shutil.rmtree, cache_dir, True)
+    environ = dict(os.environ, SQLALCHEMY_DATABASE_URI="sqlite:///" + path)
+
+    os.environ.update(environ)
+    from app import create_app
+    from benchmarks.datagen import populate
+    from models import db
+
+    with create_app().app_context():
+        db.create_all()
+        populate(db, 1)
+
+    print(
+        "{:<26} {:>10} {:>10} {:>12}".format(
+            "", "warm-up ms", "first ms", "all pages ms"
+        )
+    )
+    for name, bytecode, preload in MODES:
+        environ["TEMPLATE_CACHE_DIR"] = cache_dir if bytecode else ""
+        if bytecode:
+            subprocess.run(
+                [sys.executable, "-m", "flask", "compile-templates"],
+                env=dict(environ, FLASK_APP="app.py"),
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+        results = [run(environ, preload) for _ in range(args.runs)]
+        print(
+            "{:<26} {:>10.1f} {:>10.1f} {:>12.1f}".format(
+                name,
+                percentile([result["warm_up_ms"] for result in results], 0.5),
+                percentile([result["latencies"][0] for result in results], 0.5),
+                percentile([sum(result["latencies"]) for result in results], 0.5),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
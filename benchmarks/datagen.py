@@ -0,0 +1,229 @@
+"""Synthetic catalog generator for the route benchmarks.
+
+A scale factor of 1 produces 100 venues, 200 artists and 1000 shows. Cities
+and genres follow a Zipf-like skew so a few big cities and popular genres
+dominate, like the real catalog.
+
+    python -m benchmarks.datagen --scale 10
+"""
+
+import argparse
+import math
+import os
+import random
+from datetime import datetime, timedelta
+
+from forms import MusicGenre
+from geo import load_gazetteer
+
+VENUES_PER_SCALE = 100
+ARTISTS_PER_SCALE = 200
+SHOWS_PER_SCALE = 1000
+
+CITIES = [
+    ("New York", "NY"),
+    ("Los Angeles", "CA"),
+    ("Chicago", "IL"),
+    ("Houston", "TX"),
+    ("Phoenix", "AZ"),
+    ("Philadelphia", "PA"),
+    ("San Antonio", "TX"),
+    ("San Diego", "CA"),
+    ("Dallas", "TX"),
+    ("Austin", "TX"),
+    ("San Francisco", "CA"),
+    ("Seattle", "WA"),
+    ("Denver", "CO"),
+    ("Nashville", "TN"),
+    ("Boston", "MA"),
+    ("Portland", "OR"),
+    ("Las Vegas", "NV"),
+    ("Detroit", "MI"),
+    ("Memphis", "TN"),
+    ("Atlanta", "GA"),
+    ("Miami", "FL"),
+    ("Minneapolis", "MN"),
+    ("New Orleans", "LA"),
+    ("Kansas City", "MO"),
+    ("Salt Lake City", "UT"),
+]
+GENRES = [genre.value for genre in MusicGenre]
+GAZETTEER_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "gazetteer.csv",
+)
+WORDS = [
+    "Blue",
+    "Hop",
+    "Musical",
+    "Velvet",
+    "Electric",
+    "Golden",
+    "Wild",
+    "Sax",
+    "Lounge",
+    "Garden",
+    "Hall",
+    "Room",
+    "Club",
+    "Band",
+    "Collective",
+    "Petals",
+    "Live",
+    "Coffee",
+    "Pianos",
+    "Owl",
+]
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Generator:
+    def __init__(self, scale=1, seed=42, now=None, duration=timedelta(hours=2)):
+        self.scale = scale
+        self.duration = duration
+        self.random = random.Random(seed)
+        self.now = now or datetime.now().replace(microsecond=0)
+        self.city_weights = zipf_weights(len(CITIES))
+        self.genre_weights = zipf_weights(len(GENRES), 0.8)
+        # Separate, so the rest of the catalog does not depend on it.
+        self.place_random = random.Random(seed + 1)
+        self.places = load_gazetteer(GAZETTEER_PATH)
+
+    def name(self, index):
+        words = self.random.sample(WORDS, self.random.randint(1, 3))
+        return "The {} {}".format(" ".join(words), index)
+
+    def city(self):
+        return self.random.choices(CITIES, self.city_weights)[0]
+
+    def location(self, city, state):
+        # Spread within about 15 km of the city center.
+        lat, lng = self.places[city.lower(), state]
+        spread = self.place_random.uniform
+        return round(lat + spread(-0.13, 0.13), 5), round(lng + spread(-0.17, 0.17), 5)
+
+    def genres(self):
+        count = self.random.randint(1, 3)
+        return sorted(set(self.random.choices(GENRES, self.genre_weights, k=count)))
+
+    def venues(self):
+        for index in range(1, VENUES_PER_SCALE * self.scale + 1):
+            city, state = self.city()
+            latitude, longitude = self.location(city, state)
+            yield {
+                "id": index,
+                "name": self.name(index),
+                "city": city,
+                "state": state,
+                "latitude": latitude,
+                "longitude": longitude,
+                "address": "{} Main Street".format(index),
+                "phone": "555-{:04d}".format(index % 10000),
+                "genres": self.genres(),
+                "image_link": "https://example.com/venues/{}.jpg".format(index),
+                "facebook_link": "https://www.facebook.com/venue{}".format(index),
+                "website": "https://example.com/venues/{}".format(index),
+            }
+
+    def artists(self):
+        for index in range(1, ARTISTS_PER_SCALE * self.scale + 1):
+            city, state = self.city()
+            yield {
+                "id": index,
+                "name": self.name(index),
+                "city": city,
+                "state": state,
+                "phone": "555-{:04d}".format(index % 10000),
+                "genres": self.genres(),
+                "image_link": "https://example.com/artists/{}.jpg".format(index),
+                "facebook_link": "https://www.facebook.com/artist{}".format(index),
+                "seeking_venue": self.random.random() < 0.3,
+                "seeking_description": "",
+            }
+
+    def shows(self):
+        venues = VENUES_PER_SCALE * self.scale
+        artists = ARTISTS_PER_SCALE * self.scale
+        # Popular venues and artists get most of the bookings.
+        venue_weights = zipf_weights(venues, 0.7)
+        artist_weights = zipf_weights(artists, 0.7)
+        venue_ids = range(1, venues + 1)
+        artist_ids = range(1, artists + 1)
+        # Shows at the same venue are drawn again until they do not overlap.
+        spacing = math.ceil(self.duration / timedelta(hours=1))
+        booked = set()
+        for index in range(1, SHOWS_PER_SCALE * self.scale + 1):
+            while True:
+                # Two years of history and one year of upcoming shows.
+                hours = self.random.randint(-2 * 8760, 8760)
+                venue_id = self.random.choices(venue_ids, venue_weights)[0]
+                if not any(
+                    (venue_id, hours + offset) in booked
+                    for offset in range(1 - spacing, spacing)
+                ):
+                    break
+            booked.add((venue_id, hours))
+            yield {
+                "id": index,
+                "venue_id": venue_id,
+                "artist_id": self.random.choices(artist_ids, artist_weights)[0],
+                "start_time": self.now + timedelta(hours=hours),
+            }
+
+
+def batches(rows, size=1000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def populate(db, scale=1, seed=42):
+    from flask import current_app
+
+    from bookings import book_rows
+    from counters import recount
+    from importer import reset_sequence
+    from models import Artist, MusicShow, Venue
+
+    duration = timedelta(minutes=current_app.config["SHOW_DEFAULT_DURATION"])
+    generator = Generator(scale, seed, duration=duration)
+    for model, rows in (
+        (Venue, generator.venues()),
+        (Artist, generator.artists()),
+        (MusicShow, generator.shows()),
+    ):
+        for batch in batches(rows):
+            db.session.execute(model.__table__.insert(), batch)
+            if model is MusicShow:
+                book_rows(batch)
+        db.session.commit()
+        reset_sequence(model)
+    recount(Venue)
+    recount(Artist)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import db
+
+    with create_app().app_context():
+        populate(db, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Per-tile cost of the ``datetime`` template filter on a 10k show page.
+
+Compares the previous filter, which parsed every value with dateutil and let
+babel interpret the pattern on each call, with filters.format_datetime.
+
+    python -m benchmarks.datetime_filter [--shows 10000] [--repeat 5]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from jinja2 import Environment
+
+from filters import format_datetime, format_native_datetime
+
+TILE = (
+    "{% for show in shows %}"
+    "<div class='tile tile-show'><h4>{{ show.start_time|datetime('full') }}</h4>"
+    "</div>{% endfor %}"
+)
+
+
+def legacy_format_datetime(value, format="medium"):
+    date = dateutil.parser.parse(value)
+    if format == "full":
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == "medium":
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def render_time(filter, shows, repeat):
+    env = Environment()
+    env.filters["datetime"] = filter
+    template = env.from_string(TILE)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        template.render(shows=shows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2021, 1, 1, 20, 0)
+    times = [start + timedelta(hours=i) for i in range(args.shows)]
+    legacy_shows = [{"start_time": str(value)} for value in times]
+    shows = [{"start_time": value} for value in times]
+
+    results = [
+        ("dateutil + babel", render_time(legacy_format_datetime, legacy_shows, 1)),
+    ]
+    format_native_datetime.cache_clear()
+    results.append(("precompiled, cold", render_time(format_datetime, shows, 1)))
+    results.append(
+        ("precompiled, warm", render_time(format_datetime, shows, args.repeat))
+    )
+    for name, elapsed in results:
+        print(
+            "{:<20} {:8.1f} ms/page {:8.2f} us/tile".format(
+                name, elapsed * 1000, elapsed * 1e6 / args.shows
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Venue and artist pages under concurrent load, sync WSGI against asgi.py.
+
+The sync path runs the Flask views on a pool of threads, like gunicorn's
+gthread workers. The async path awaits the ASGI application of asgi.py,
+which runs the queries of a page concurrently. Both render the same
+templates from a synthetic catalog (see benchmarks.datagen) in a temporary
+SQLite file, or --database-url. --latency adds a delay to every query to
+emulate the round trip to a remote database.
+
+    python -m benchmarks.detail_pages --concurrency 16 --latency 2
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.routes import percentile
+
+
+def detail_paths(count, venues, artists, seed=7):
+    generator = random.Random(seed)
+    return [
+        "/venues/{}".format(generator.randint(1, venues))
+        if generator.random() < 0.5
+        else "/artists/{}".format(generator.randint(1, artists))
+        for _ in range(count)
+    ]
+
+
+def run_sync(app, paths, concurrency):
+    def fetch(path):
+        started = time.perf_counter()
+        response = app.test_client().get(path)
+        response.get_data()
+        assert response.status_code == 200, (path, response.status_code)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(fetch, paths))
+    return latencies, time.perf_counter() - started
+
+
+async def asgi_get(app, path):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+async def run_async(app, paths, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(path):
+        async with semaphore:
+            started = time.perf_counter()
+            status = await asgi_get(app, path)
+            assert status == 200, (path, status)
+            return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*[fetch(path) for path in paths])
+    return latencies, time.perf_counter() - started
+
+
+def report(name, latencies, elapsed):
+    print(
+        "{:<6} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.0f}".format(
+            name,
+            percentile(latencies, 0.50),
+            percentile(latencies, 0.95),
+            percentile(latencies, 0.99),
+            len(latencies) / elapsed,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="SQLite temporary file by default.")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Milliseconds added per query."
+    )
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        handle, path = tempfile.mkstemp(suffix=".db", prefix="fyyur-bench-")
+        os.close(handle)
+        atexit.register(os.remove, path)
+        database_url = "sqlite:///" + path
+    os.environ["SQLALCHEMY_DATABASE_URI"] = database_url
+
+    from sqlalchemy import event
+
+    import asgi
+    from app import create_app
+    from benchmarks.datagen import ARTISTS_PER_SCALE, VENUES_PER_SCALE, populate
+    from cache import page_cache
+    from models import db, Venue
+
+    app = create_app()
+    # Both paths query the database on every request.
+    page_cache.enabled = False
+    app.config["DATABASE_POOL_SIZE"] = args.concurrency
+    delay = args.latency / 1000
+
+    with app.app_context():
+        db.create_all()
+        if Venue.query.first() is not None:
+            sys.exit("The database is not empty.")
+        populate(db, args.scale)
+        if delay:
+            event.listen(
+                db.engine, "before_cursor_execute", lambda *a: time.sleep(delay)
+            )
+
+    paths = detail_paths(
+        args.requests, VENUES_PER_SCALE * args.scale, ARTISTS_PER_SCALE * args.scale
+    )
+    asgi_app = asgi.AsyncDetailPages(app)
+
+    async def run_asgi():
+        database = await asgi_app.connect()
+        if delay:
+            fetch = database.fetch
+
+            async def delayed_fetch(*args):
+                await asyncio.sleep(delay)
+                return await fetch(*args)
+
+            database.fetch = delayed_fetch
+        try:
+            return await run_async(asgi_app, paths, args.concurrency)
+        finally:
+            await database.close()
+
+    print(
+        "{} requests, {} concurrent, {} ms per query".format(
+            args.requests, args.concurrency, args.latency
+        )
+    )
+    print(
+        "{:<6} {:>9} {:>9} {:>9} {:>9}".format(
+            "path", "p50 ms", "p95 ms", "p99 ms", "req/s"
+        )
+    )
+    report("sync", *run_sync(app, paths, args.concurrency))
+    report("async", *asyncio.run(run_asgi()))
+
+
+if __name__ == "__main__":
+    main()
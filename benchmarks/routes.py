@@ -0,0 +1,422 @@
+"""Latency and SQL statement count of every route, checked against a baseline.
+
+Drives each route of app.py through the Flask test client on a synthetic
+catalog (see benchmarks.datagen) and reports p50/p95/p99 latencies and the
+number of SQL statements per request. With --check the run fails when a route
+issues more statements than the stored baseline, answers with another status
+or its median latency regresses by more than the tolerance.
+
+    python -m benchmarks.routes --check
+    python -m benchmarks.routes --database-url postgresql://localhost/fyyur_bench
+    python -m benchmarks.routes --update-baseline
+
+The database must be empty, or pass --reset to drop and recreate its tables.
+"""
+
+import argparse
+import atexit
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+EXPORT_TOKEN = "benchmark"
+# Venues with more shows than this are deleted in the background.
+DELETE_BATCH_SIZE = 10
+
+VENUE_FORM = {
+    "name": "The Benchmark Hall",
+    "city": "Austin",
+    "state": "TX",
+    "address": "1 Benchmark Road",
+    "phone": "555-0100",
+    "genres": ["Jazz", "Blues"],
+    "image_link": "https://example.com/venue.jpg",
+    "facebook_link": "https://www.facebook.com/benchmark",
+}
+ARTIST_FORM = {
+    "name": "The Benchmark Band",
+    "city": "Austin",
+    "state": "TX",
+    "phone": "555-0101",
+    "genres": ["Jazz"],
+    "seeking_venue": "False",
+    "seeking_description": "",
+    "image_link": "https://example.com/artist.jpg",
+    "facebook_link": "https://www.facebook.com/benchmark",
+}
+
+
+def show_form(index):
+    # A new start time per request, or every show after the first would be
+    # rejected as a booking conflict.
+    start_time = datetime(2030, 1, 1, 20) + timedelta(hours=3 * index)
+    return {"artist_id": "1", "venue_id": "1", "start_time": str(start_time)}
+
+
+BULK_SHOWS = 20
+
+
+def bulk_shows(venue_id, index):
+    # BULK_SHOWS shows a day apart, after those of the previous requests.
+    start = datetime(2033, 1, 1, 20) + timedelta(days=BULK_SHOWS * index)
+    return [
+        {
+            "artist_id": 1,
+            "venue_id": venue_id,
+            "start_time": str(start + timedelta(days=day)),
+        }
+        for day in range(BULK_SHOWS)
+    ]
+
+
+def bulk_show_form(index):
+    lines = [
+        "{artist_id},{venue_id},{start_time}".format(**show)
+        for show in bulk_shows(3, index)
+    ]
+    return {"shows": "\n".join(lines)}
+
+
+def bulk_shows_json(index):
+    return json.dumps({"shows": bulk_shows(4, index)})
+
+
+class Route:
+    def __init__(self, name, method, url, data=None, ids=None, headers=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        # A dict, or a function of the index of the request returning one.
+        self.data = data
+        # Called with the number of requests, returns one id per request for
+        # routes that consume their target, like the deletes.
+        self.ids = ids
+        self.headers = headers
+
+
+def throwaway(model, fields):
+    def create(count):
+        from models import db
+
+        entities = [model(**fields) for _ in range(count)]
+        db.session.add_all(entities)
+        db.session.commit()
+        return [entity.id for entity in entities]
+
+    return create
+
+
+def throwaway_with_shows(model, fields, shows):
+    # Entities with that many shows, with artist or venue 1, e.g. more than
+    # DELETE_BATCH_SIZE so that their deletion goes to the background.
+    def create(count):
+        from counters import recount_ids
+        from models import db, MusicShow, Venue
+
+        ids = throwaway(model, fields)(count)
+        side, other = (
+            ("venue_id", "artist_id") if model is Venue else ("artist_id", "venue_id")
+        )
+        start = datetime(2032, 1, 1, 20)
+        db.session.execute(
+            MusicShow.__table__.insert(),
+            [
+                {side: entity_id, other: 1, "start_time": start + timedelta(days=day)}
+                for entity_id in ids
+                for day in range(shows)
+            ],
+        )
+        recount_ids(**{side + "s": ids, other + "s": [1]})
+        db.session.commit()
+        return ids
+
+    return create
+
+
+def wait_for_deletions(timeout=60):
+    from models import DeletionJob
+
+    deadline = time.monotonic() + timeout
+    while DeletionJob.query.filter(
+        DeletionJob.status.in_(["pending", "running"])
+    ).count():
+        if time.monotonic() > deadline:
+            sys.exit("The background deletions did not finish.")
+        time.sleep(0.05)
+
+
+def routes():
+    from models import Artist, DeletionJob, Venue
+
+    venue_fields = dict(VENUE_FORM)
+    artist_fields = dict(ARTIST_FORM, seeking_venue=False)
+    return [
+        Route("index", "GET", "/"),
+        Route("venues", "GET", "/venues"),
+        Route("venues_page_2", "GET", "/venues?page=2"),
+        Route("venues_genre", "GET", "/venues?genre=Jazz"),
+        Route("search_venues", "POST", "/venues/search", {"search_term": "hop"}),
+        Route("show_venue", "GET", "/venues/1"),
+        Route("venues_near", "GET", "/venues/near?lat=40.73&lng=-73.99&radius=10"),
+        Route(
+            "available_venues",
+            "GET",
+            "/venues/available?city=New+York&from=2027-01-08T20:00&to=2027-01-08T23:00",
+        ),
+        Route("create_venue_form", "GET", "/venues/create"),
+        Route("create_venue_submission", "POST", "/venues/create", VENUE_FORM),
+        Route("edit_venue", "GET", "/venues/2/edit"),
+        Route("edit_venue_submission", "POST", "/venues/2/edit", VENUE_FORM),
+        Route(
+            "delete_venue",
+            "DELETE",
+            "/venues/{}",
+            ids=throwaway(Venue, venue_fields),
+        ),
+        Route(
+            "delete_venue_background",
+            "DELETE",
+            "/venues/{}",
+            ids=throwaway_with_shows(Venue, venue_fields, DELETE_BATCH_SIZE + 1),
+        ),
+        Route(
+            "deletion_status",
+            "GET",
+            "/deletions/{}",
+            ids=throwaway(
+                DeletionJob,
+                {"entity": "venue", "entity_id": 0, "status": "done", "show_count": 0},
+            ),
+        ),
+        Route("artists", "GET", "/artists"),
+        Route("artists_genre", "GET", "/artists?genre=Jazz&state=NY"),
+        Route("search_artists", "POST", "/artists/search", {"search_term": "band"}),
+        Route("show_artist", "GET", "/artists/1"),
+        Route("create_artist_form", "GET", "/artists/create"),
+        Route("create_artist_submission", "POST", "/artists/create", ARTIST_FORM),
+        Route("edit_artist", "GET", "/artists/2/edit"),
+        Route("edit_artist_submission", "POST", "/artists/2/edit", ARTIST_FORM),
+        Route(
+            "delete_artist",
+            "DELETE",
+            "/artists/{}",
+            ids=throwaway(Artist, artist_fields),
+        ),
+        Route("shows", "GET", "/shows"),
+        Route("shows_upcoming", "GET", "/shows?upcoming=1"),
+        Route("create_shows", "GET", "/shows/create"),
+        Route("create_show_submission", "POST", "/shows/create", show_form),
+        Route("autocomplete", "GET", "/api/autocomplete?q=the"),
+        Route(
+            "api_venues",
+            "GET",
+            "/api/v1/venues?embed=shows&ids=" + ",".join(map(str, range(1, 51))),
+        ),
+        Route(
+            "api_artists",
+            "GET",
+            "/api/v1/artists?fields=name,genres&ids="
+            + ",".join(map(str, range(1, 101))),
+        ),
+        Route(
+            "api_shows", "GET", "/api/v1/shows?ids=" + ",".join(map(str, range(1, 101)))
+        ),
+        Route(
+            "export_shows",
+            "GET",
+            "/export/shows.ndjson",
+            headers={"Authorization": "Bearer " + EXPORT_TOKEN},
+        ),
+        # Last, as every request adds BULK_SHOWS shows to the catalog.
+        Route("create_shows_bulk", "POST", "/shows/bulk", bulk_show_form),
+        Route(
+            "api_create_shows",
+            "POST",
+            "/api/v1/shows",
+            bulk_shows_json,
+            headers={"Content-Type": "application/json"},
+        ),
+    ]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class StatementCounter:
+    # Counts the statements of the requests, not those of the background
+    # deletions they start.
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self.thread = threading.get_ident()
+        event.listen(engine, "before_cursor_execute", self.increment)
+
+    def increment(self, *args):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+
+def measure(client, counter, route, requests, warmup):
+    ids = route.ids(requests + warmup) if route.ids else None
+    latencies = []
+    statements = []
+    statuses = set()
+    for index in range(requests + warmup):
+        url = route.url.format(ids[index]) if ids else route.url
+        data = route.data(index) if callable(route.data) else route.data
+        counter.count = 0
+        started = time.perf_counter()
+        response = client.open(
+            url, method=route.method, data=data, headers=route.headers
+        )
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        statuses.add(response.status_code)
+        if index >= warmup:
+            latencies.append(elapsed * 1000)
+            statements.append(counter.count)
+    return {
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "statements": max(statements),
+        "status": sorted(statuses),
+    }
+
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["statements"] > expected["statements"]:
+            failures.append(
+                "{}: {} SQL statements, baseline {}".format(
+                    name, result["statements"], expected["statements"]
+                )
+            )
+        # The median is compared, tail latencies are too noisy to gate on.
+        # A 1 ms floor keeps sub-millisecond routes from failing on noise.
+        limit = expected["p50_ms"] * (1 + tolerance) + 1.0
+        if result["p50_ms"] > limit:
+            failures.append(
+                "{}: p50 {:.2f} ms, baseline {:.2f} ms".format(
+                    name, result["p50_ms"], expected["p50_ms"]
+                )
+            )
+        if any(status >= 500 for status in result["status"]):
+            failures.append("{}: server error {}".format(name, result["status"]))
+        elif "status" in expected and result["status"] != expected["status"]:
+            failures.append(
+                "{}: status {}, baseline {}".format(
+                    name, result["status"], expected["status"]
+                )
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="SQLite temporary file by default.")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--reset", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        handle, path = tempfile.mkstemp(suffix=".db", prefix="fyyur-bench-")
+        os.close(handle)
+        atexit.register(os.remove, path)
+        database_url = "sqlite:///" + path
+    os.environ["SQLALCHEMY_DATABASE_URI"] = database_url
+
+    from app import create_app
+    from benchmarks.datagen import populate
+    from cache import page_cache
+    from models import db, Venue
+    from search import artist_search, autocomplete, venue_search
+
+    app = create_app()
+    # Measure what every request costs, not how well the pages cache.
+    page_cache.enabled = False
+    app.config["EXPORT_TOKEN"] = EXPORT_TOKEN
+    app.config["DELETE_BATCH_SIZE"] = DELETE_BATCH_SIZE
+
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if Venue.query.first() is not None:
+            sys.exit("The database is not empty, pass --reset to recreate it.")
+        populate(db, args.scale)
+        autocomplete.load()
+        venue_search.reset()
+        artist_search.reset()
+
+        client = app.test_client()
+        results = {}
+        print(
+            "{:<26} {:>9} {:>9} {:>9} {:>6}".format(
+                "route", "p50 ms", "p95 ms", "p99 ms", "SQL"
+            )
+        )
+        for route in routes():
+            result = measure(client, counter, route, args.requests, args.warmup)
+            # Outside of the timings, so they do not slow the next route.
+            wait_for_deletions()
+            results[route.name] = result
+            print(
+                "{:<26} {p50_ms:>9.2f} {p95_ms:>9.2f} {p99_ms:>9.2f} "
+                "{statements:>6}".format(route.name, **result)
+            )
+
+        key = "{}/scale-{}".format(db.engine.dialect.name, args.scale)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as stream:
+            baselines = json.load(stream)
+
+    if args.update_baseline:
+        baselines[key] = {
+            name: {
+                "p50_ms": result["p50_ms"],
+                "p95_ms": result["p95_ms"],
+                "statements": result["statements"],
+                "status": result["status"],
+            }
+            for name, result in results.items()
+        }
+        with open(args.baseline, "w") as stream:
+            json.dump(baselines, stream, indent=2, sort_keys=True)
+            stream.write("\n")
+        print("Baseline {} written to {}".format(key, args.baseline))
+
+    if args.check:
+        if key not in baselines:
+            sys.exit("No baseline for {}, run with --update-baseline.".format(key))
+        failures = compare(results, baselines[key], args.tolerance)
+        if failures:
+            print("\n".join(["Regressions against {}:".format(key)] + failures))
+            sys.exit(1)
+        print("No regression against {}.".format(key))
+
+
+if __name__ == "__main__":
+    main()
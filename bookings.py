@@ -0,0 +1,138 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import and_, exists, func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, MusicShow, Venue, VenueBooking
+
+# A show books its venue from its start_time for its duration, and the
+# bookings of a venue may not overlap. Postgres enforces it with the
+# venue_booking_no_overlap exclusion constraint, and book() checks it first
+# on every database. No booking lasts more than SHOW_MAX_DURATION, so the
+# bookings overlapping a range all start within that much before it: both
+# the check and the availability search are one bounded scan of the
+# (venue_id, start_time) index.
+
+
+class BookingConflict(Exception):
+    pass
+
+
+def overlapping(venue_id, start, end):
+    max_duration = timedelta(minutes=current_app.config["SHOW_MAX_DURATION"])
+    return and_(
+        VenueBooking.venue_id == venue_id,
+        VenueBooking.start_time > start - max_duration,
+        VenueBooking.start_time < end,
+        VenueBooking.end_time > start,
+    )
+
+
+def book(venue_id, start, duration):
+    """Book the venue from start for duration, in the current transaction.
+
+    Raises BookingConflict when it is already booked during that time.
+    """
+    end = start + duration
+    if db.session.query(exists().where(overlapping(venue_id, start, end))).scalar():
+        raise BookingConflict()
+    db.session.add(VenueBooking(venue_id=venue_id, start_time=start, end_time=end))
+    try:
+        db.session.flush()
+    except IntegrityError as error:
+        # A concurrent booking got there first.
+        if getattr(error.orig, "pgcode", None) == "23P01":
+            raise BookingConflict()
+        raise
+
+
+def check_bookings(rows):
+    # Rows overlapping a booking, or an earlier row at the same venue, are
+    # rejected. The bookings of a venue do not overlap, so only the last one
+    # starting before a row ends can overlap it.
+    if not rows:
+        return [], []
+    max_duration = timedelta(minutes=current_app.config["SHOW_MAX_DURATION"])
+    booked = defaultdict(list)
+    bookings = db.session.query(
+        VenueBooking.venue_id, VenueBooking.start_time, VenueBooking.end_time
+    ).filter(
+        VenueBooking.venue_id.in_({row["venue_id"] for _, row in rows}),
+        VenueBooking.start_time
+        > min(row["start_time"] for _, row in rows) - max_duration,
+        VenueBooking.start_time < max(row["end_time"] for _, row in rows),
+    )
+    for venue_id, start, end in bookings:
+        booked[venue_id].append((start, end, 0))
+    for intervals in booked.values():
+        intervals.sort()
+
+    accepted = []
+    rejected = []
+    seen = {}
+    for number, row in rows:
+        key = (row["venue_id"], row["artist_id"], row["start_time"])
+        if key in seen:
+            rejected.append((number, "duplicate of row {}".format(seen[key])))
+            continue
+        seen[key] = number
+        intervals = booked[row["venue_id"]]
+        position = bisect_left(intervals, (row["end_time"],))
+        if position and intervals[position - 1][1] > row["start_time"]:
+            other = intervals[position - 1][2]
+            if other:
+                error = "overlaps row {} at venue {}".format(other, row["venue_id"])
+            else:
+                error = "venue {} is already booked at that time".format(
+                    row["venue_id"]
+                )
+            rejected.append((number, error))
+            continue
+        insort(intervals, (row["start_time"], row["end_time"], number))
+        accepted.append((number, row))
+    return accepted, rejected
+
+
+def book_rows(rows):
+    # The bookings of imported shows, checked by check_bookings first.
+    # Concurrent conflicts raise an IntegrityError from the constraint or
+    # the unique index.
+    duration = timedelta(minutes=current_app.config["SHOW_DEFAULT_DURATION"])
+    db.session.execute(
+        VenueBooking.__table__.insert(),
+        [
+            {
+                "venue_id": row["venue_id"],
+                "start_time": row["start_time"],
+                "end_time": row["start_time"] + duration,
+            }
+            for row in rows
+        ],
+    )
+
+
+def release(venue_ids):
+    # Deletes the bookings of venue_ids left without a show.
+    show = exists().where(
+        and_(
+            MusicShow.venue_id == VenueBooking.venue_id,
+            MusicShow.start_time == VenueBooking.start_time,
+        )
+    )
+    VenueBooking.query.filter(VenueBooking.venue_id.in_(list(venue_ids)), ~show).delete(
+        synchronize_session=False
+    )
+
+
+def available_venues(start, end, city=None):
+    # The venues, of a city if given, not booked at any time between start
+    # and end, with one probe of the booking index per venue.
+    query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state).filter(
+        ~exists().where(overlapping(Venue.id, start, end))
+    )
+    if city:
+        query = query.filter(func.lower(Venue.city) == city.lower())
+    return query.order_by(Venue.name, Venue.id)
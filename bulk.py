@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from bookings import check_bookings
+from cache import page_cache
+from counters import recount_ids
+from importer import RowError, resolve_shows, validate
+from models import db, MusicShow, VenueBooking
+
+# Shows listed in bulk, e.g. the dates of a tour, are validated as a set: the
+# venue and artist references with one IN query per table and kind of
+# reference, the duplicates and overlapping bookings in memory against one
+# range query of venue_booking. The valid rows are inserted with one
+# multi-row INSERT per table in a single transaction, and the others are
+# reported by row number.
+
+FIELDS = ("venue_id", "venue_name", "artist_id", "artist_name", "start_time")
+
+
+def parse_rows(rows):
+    config = current_app.config
+    parsed = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        try:
+            if not isinstance(row, dict):
+                raise RowError("a show must be an object")
+            values = validate("shows", {key: row[key] for key in FIELDS if key in row})
+            minutes = row.get("duration")
+            if minutes is None or minutes == "":
+                minutes = config["SHOW_DEFAULT_DURATION"]
+            try:
+                minutes = int(minutes)
+            except (TypeError, ValueError):
+                raise RowError("duration is not an integer")
+            if not 0 < minutes <= config["SHOW_MAX_DURATION"]:
+                raise RowError(
+                    "duration must be between 1 and {} minutes".format(
+                        config["SHOW_MAX_DURATION"]
+                    )
+                )
+            values["end_time"] = values["start_time"] + timedelta(minutes=minutes)
+            parsed.append((number, values))
+        except RowError as error:
+            errors.append((number, str(error)))
+    return parsed, errors
+
+
+def insert_shows(rows):
+    db.session.execute(
+        MusicShow.__table__.insert().values(
+            [
+                {
+                    "venue_id": row["venue_id"],
+                    "artist_id": row["artist_id"],
+                    "start_time": row["start_time"],
+                }
+                for _, row in rows
+            ]
+        )
+    )
+    db.session.execute(
+        VenueBooking.__table__.insert().values(
+            [
+                {
+                    "venue_id": row["venue_id"],
+                    "start_time": row["start_time"],
+                    "end_time": row["end_time"],
+                }
+                for _, row in rows
+            ]
+        )
+    )
+    recount_ids(
+        {row["venue_id"] for _, row in rows}, {row["artist_id"] for _, row in rows}
+    )
+    db.session.commit()
+
+
+def add_shows(rows):
+    """List the shows of rows, dicts of venue_id or venue_name, artist_id or
+    artist_name, start_time and optionally duration in minutes.
+
+    Returns the numbers, from 1, of the rows listed, and the (number, error)
+    pairs of the rows rejected.
+    """
+    parsed, errors = parse_rows(rows)
+    resolved, unresolved = resolve_shows(parsed)
+    errors.extend((number, error) for number, error, _ in unresolved)
+    accepted, conflicts = check_bookings(resolved)
+    errors.extend(conflicts)
+    if accepted:
+        try:
+            insert_shows(accepted)
+        except IntegrityError:
+            # Booked or deleted by a concurrent request: find the rows
+            # concerned one at a time so the rest still goes in.
+            db.session.rollback()
+            inserted = []
+            for number, row in accepted:
+                try:
+                    insert_shows([(number, row)])
+                    inserted.append((number, row))
+                except IntegrityError as error:
+                    db.session.rollback()
+                    # The exclusion constraint or the unique index.
+                    if "venue_booking" in str(error.orig):
+                        message = "venue {} is already booked at that time".format(
+                            row["venue_id"]
+                        )
+                    else:
+                        message = str(error.orig)
+                    errors.append((number, message))
+            accepted = inserted
+
+    if accepted:
+        page_cache.invalidate(
+            "venues",
+            "artists",
+            "shows",
+            *{"venue:{}".format(row["venue_id"]) for _, row in accepted},
+            *{"artist:{}".format(row["artist_id"]) for _, row in accepted}
+        )
+    return [number for number, _ in accepted], sorted(errors)
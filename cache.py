@@ -0,0 +1,248 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request, session
+from sqlalchemy import select, text
+
+from models import db, CacheVersion
+
+
+class LRUCache:
+    """Bounded in-process cache, evicting the least recently used entry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+INCR_VERSION = text(
+    "INSERT INTO cache_version (tag, version) VALUES (:tag, 1) "
+    "ON CONFLICT (tag) DO UPDATE SET version = cache_version.version + 1"
+)
+
+
+class DatabaseVersions:
+    """Tag versions kept in the cache_version table of the primary database,
+    so the writes of every process, CLI commands included, invalidate the
+    pages the others have cached. They are read and bumped outside of the
+    session, in their own short transactions.
+    """
+
+    def get_versions(self, tags):
+        table = CacheVersion.__table__
+        with db.engine.connect() as connection:
+            versions = dict(
+                connection.execute(
+                    select([table.c.tag, table.c.version]).where(table.c.tag.in_(tags))
+                ).fetchall()
+            )
+        return [versions.get(tag, 0) for tag in tags]
+
+    def incr_versions(self, tags):
+        # Both Postgres and SQLite, from 3.24, support this upsert. The tags
+        # are sorted so concurrent invalidations lock their rows in one order.
+        with db.engine.begin() as connection:
+            connection.execute(
+                INCR_VERSION, [{"tag": tag} for tag in sorted(set(tags))]
+            )
+
+
+class RedisCache:
+    """Cache shared by every worker through a Redis-compatible server."""
+
+    def __init__(self, url, prefix="fyyur:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=timeout or None)
+
+    def clear(self):
+        keys = self.client.keys(self.prefix + "*")
+        if keys:
+            self.client.delete(*keys)
+
+    def get_versions(self, tags):
+        if not tags:
+            return []
+        values = self.client.mget([self.prefix + "version:" + tag for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def incr_versions(self, tags):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr(self.prefix + "version:" + tag)
+        pipeline.execute()
+
+
+class PageCache:
+    """Response cache for the read pages, invalidated by the write handlers.
+
+    A page is stored under its URL and the current versions of the tags it
+    depends on, e.g. "venue:3" or "venues". Invalidating a tag bumps its
+    version, so stale entries are simply never looked up again. Entries also
+    expire after CACHE_DEFAULT_TIMEOUT because shows move from upcoming to
+    past without any write. Cached pages carry an ETag and Last-Modified
+    header and conditional requests are answered with 304 Not Modified.
+
+    CACHE_REDIS_URL selects a Redis-compatible backend shared by all workers.
+    Otherwise every process keeps its own LRU of pages and the tag versions
+    are kept in the database, which costs a query on the primary per cached
+    page served but keeps the workers coherent.
+
+    Pages rendered from a read replica may predate the write that invalidated
+    them, so they are only kept for CACHE_REPLICA_TIMEOUT, and clients reading
+    their own writes from the primary bypass the cache (see routing.py).
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.versions = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_ENABLED", True)
+        app.config.setdefault("CACHE_REDIS_URL", None)
+        app.config.setdefault("CACHE_MAX_ENTRIES", 1024)
+        app.config.setdefault("CACHE_DEFAULT_TIMEOUT", 300)
+        app.config.setdefault("CACHE_REPLICA_TIMEOUT", 30)
+        self.enabled = app.config["CACHE_ENABLED"]
+        self.timeout = app.config["CACHE_DEFAULT_TIMEOUT"]
+        self.replica_timeout = app.config["CACHE_REPLICA_TIMEOUT"]
+        if app.config["CACHE_REDIS_URL"]:
+            self.backend = self.versions = RedisCache(app.config["CACHE_REDIS_URL"])
+        else:
+            self.backend = LRUCache(app.config["CACHE_MAX_ENTRIES"])
+            self.versions = DatabaseVersions()
+        app.extensions["page_cache"] = self
+
+    def invalidate(self, *tags):
+        if tags:
+            self.versions.incr_versions(tags)
+
+    def clear(self):
+        # Every key depends on the "all" tag, also for the other processes.
+        self.invalidate("all")
+        self.backend.clear()
+
+    def _key(self, prefix, tags):
+        tags = ["all"] + list(tags)
+        versions = self.versions.get_versions(tags)
+        return "{}:{}".format(
+            prefix,
+            ",".join(
+                "{}={}".format(tag, version) for tag, version in zip(tags, versions)
+            ),
+        )
+
+    def _timeout(self):
+        if g.get("replica_bind") is not None:
+            return min(self.timeout, self.replica_timeout)
+        return self.timeout
+
+    def memoize(self, name, tags, compute):
+        """Return the cached result of compute(), computed again once one of
+        the tags is invalidated. Pages share costly parts this way.
+        """
+        if not self.enabled or g.get("read_your_writes"):
+            return compute()
+        key = self._key("value:" + name, tags)
+        value = self.backend.get(key)
+        if value is None:
+            value = compute()
+            self.backend.set(key, value, self._timeout())
+        return value
+
+    def _store_sent(self, key, chunks, mimetype, timeout):
+        body = []
+        for chunk in chunks:
+            body.append(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            yield chunk
+        body = b"".join(body)
+        entry = (body, mimetype, hashlib.md5(body).hexdigest(), int(time.time()))
+        self.backend.set(key, entry, timeout)
+
+    def cached(self, *tags):
+        # Tags are formatted with the view arguments: "venue:{venue_id}".
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                # Pages carrying a flashed message are rendered once, as is.
+                if (
+                    not self.enabled
+                    or "_flashes" in session
+                    or g.get("read_your_writes")
+                ):
+                    return view(**kwargs)
+
+                page_tags = [tag.format(**kwargs) for tag in tags]
+                key = self._key("page:" + request.full_path, page_tags)
+                entry = self.backend.get(key)
+                if entry is None:
+                    response = make_response(view(**kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if response.is_streamed:
+                        # Cached once it has been sent in full.
+                        response.response = self._store_sent(
+                            key, response.response, response.mimetype, self._timeout()
+                        )
+                        return response
+                    body = response.get_data()
+                    entry = (
+                        body,
+                        response.mimetype,
+                        hashlib.md5(body).hexdigest(),
+                        int(time.time()),
+                    )
+                    self.backend.set(key, entry, self._timeout())
+
+                body, mimetype, etag, last_modified = entry
+                response = Response(body, mimetype=mimetype)
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.cache_control.no_cache = True
+                return response.make_conditional(request)
+
+            return wrapper
+
+        return decorator
+
+
+page_cache = PageCache()
@@ -1,9 +1,12 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
-SECRET_KEY = os.urandom(32)
+# Sessions, and so flashed messages, are signed with this key. It must be the
+# same in every worker: set SECRET_KEY in production, see ProductionConfig.
+SECRET_KEY = os.environ.get("SECRET_KEY") or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -15,3 +18,139 @@ DEBUG = True
 
 # DONE: IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI")
+
+# Connection pool of every engine, per worker process, see routing.py. A
+# gunicorn worker runs up to GUNICORN_THREADS requests at once, and
+# gunicorn.conf.py sizes the pools from it.
+DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", 5))
+DATABASE_MAX_OVERFLOW = int(os.environ.get("DATABASE_MAX_OVERFLOW", 5))
+DATABASE_POOL_TIMEOUT = 10
+DATABASE_POOL_RECYCLE = 1800
+# Set DATABASE_PGBOUNCER=1 behind PgBouncer in transaction pooling mode: the
+# workers then open a connection per checkout and keep no pool of their own.
+DATABASE_PGBOUNCER = os.environ.get("DATABASE_PGBOUNCER") == "1"
+
+# Comma separated read replicas queried by the read-only views. A client
+# reads from the primary for REPLICA_READ_YOUR_WRITES seconds after a write.
+SQLALCHEMY_REPLICA_URIS = [
+    uri for uri in os.environ.get("SQLALCHEMY_REPLICA_URIS", "").split(",") if uri
+]
+REPLICA_READ_YOUR_WRITES = 10
+
+# Number of city/state areas rendered per page of the venues listing.
+AREAS_PER_PAGE = 50
+
+# Number of shows rendered per page of the shows feed.
+SHOWS_PER_PAGE = 30
+
+# A show books its venue for SHOW_DEFAULT_DURATION minutes unless the form
+# says otherwise, and for SHOW_MAX_DURATION at most, see bookings.py.
+SHOW_DEFAULT_DURATION = 120
+SHOW_MAX_DURATION = 24 * 60
+# Maximum number of shows listed at once by /shows/bulk and POST
+# /api/v1/shows, see bulk.py.
+BULK_SHOWS_MAX = 500
+
+# On Postgres music_show is partitioned by month of start_time, see
+# partitions.py. `flask partition-shows` keeps SHOW_PARTITIONS_AHEAD months
+# ready ahead and moves the months older than SHOW_PARTITIONS_RETAIN to the
+# SHOW_ARCHIVE_SCHEMA schema, None to keep them all.
+SHOW_PARTITIONS_AHEAD = 12
+SHOW_PARTITIONS_RETAIN = None
+SHOW_ARCHIVE_SCHEMA = "archive"
+
+# Maximum number of venues or artists returned by a search.
+SEARCH_RESULT_LIMIT = 50
+
+# Default and maximum number of suggestions returned by /api/autocomplete.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+# Seconds before the autocomplete index is rebuilt to pick up the writes
+# handled by other workers, None to never rebuild it.
+AUTOCOMPLETE_MAX_AGE = None
+# Likewise for the in-process search index used when pg_trgm is unavailable.
+SEARCH_INDEX_MAX_AGE = None
+
+# Cities and their coordinates, used to place the venues on the map.
+GAZETTEER_PATH = os.environ.get(
+    "GAZETTEER_PATH", os.path.join(basedir, "data", "gazetteer.csv")
+)
+# Default and maximum radius in kilometers, and number of venues, of
+# /venues/near.
+NEAR_RADIUS = 25
+NEAR_MAX_RADIUS = 500
+NEAR_LIMIT = 20
+NEAR_MAX_LIMIT = 100
+# Cell size in degrees of the in-process grid index of venue coordinates, and
+# seconds before it is rebuilt to pick up the writes of other workers and the
+# imports, None to never rebuild it.
+GEO_GRID_CELL_SIZE = 0.25
+GEO_INDEX_MAX_AGE = None
+
+# Link the fingerprinted and precompressed bundles built by
+# `flask build-assets` instead of the static sources, see assets.py.
+ASSETS_BUNDLED = False
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+# Compiled templates are cached as bytecode in this directory, outside of the
+# project so that file watchers do not restart on it, see templating.py. Set
+# it to a shared volume to share it between hosts, or to "" to disable it.
+TEMPLATE_CACHE_DIR = os.environ.get(
+    "TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fyyur-templates")
+)
+# Templates loaded by warm_up before the workers accept requests.
+TEMPLATE_PRELOAD = ["layouts/", "pages/", "forms/"]
+
+# Send the venue, artist and show listings as they render, see streaming.py.
+# Jinja events buffered per chunk, and uncompressed bytes per gzip flush.
+STREAM_LISTINGS = False
+STREAM_BUFFER_EVENTS = 5
+STREAM_GZIP_MIN_SIZE = 4096
+
+# Page cache for the read pages, see cache.py. Without CACHE_REDIS_URL every
+# worker keeps its own in-process LRU of CACHE_MAX_ENTRIES pages, and the
+# versions invalidating them are shared through the cache_version table.
+CACHE_ENABLED = True
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+CACHE_MAX_ENTRIES = 1024
+CACHE_DEFAULT_TIMEOUT = 300
+# Pages rendered from a read replica may lag behind, keep them for less.
+CACHE_REPLICA_TIMEOUT = 30
+
+# Maximum number of ids per /api/v1 batch request, and the size from which
+# its responses are gzipped for the clients accepting it.
+API_MAX_IDS = 100
+API_GZIP_MIN_SIZE = 1024
+
+# Bearer token required by the /export endpoints, which are disabled without it.
+EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN")
+
+# Venues and artists are deleted with their shows, DELETE_BATCH_SIZE shows
+# per transaction, in the background when they have more, see deletions.py.
+# `flask run-deletions` resumes the deletions without progress for
+# DELETE_STALE_AFTER seconds.
+DELETE_BATCH_SIZE = 1000
+DELETE_STALE_AFTER = 300
+
+# Warn when a request issues more SQL statements than its budget, see
+# metrics.py. SQL_QUERY_BUDGETS overrides the default per endpoint.
+SQL_QUERY_BUDGET = 10
+SQL_QUERY_BUDGETS = {"main.shows": 5, "main.venues": 5, "main.artists": 5}
+METRICS_ENDPOINT = True
+
+
+class ProductionConfig:
+    """Overrides for the pre-forked gunicorn workers, loaded by wsgi.py.
+
+    The workers share nothing but the database (and Redis if CACHE_REDIS_URL
+    is set), so the secret key comes from the environment and the page cache
+    invalidations go through one or the other.
+    """
+
+    DEBUG = False
+    SECRET_KEY = os.environ.get("SECRET_KEY")
+    AUTOCOMPLETE_MAX_AGE = 300
+    SEARCH_INDEX_MAX_AGE = 300
+    GEO_INDEX_MAX_AGE = 300
+    ASSETS_BUNDLED = True
+    STREAM_LISTINGS = True
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, case, func, or_, select
+
+from cache import page_cache
+from models import db, Artist, MusicShow, Venue
+
+# Venue and Artist keep upcoming_show_count, past_show_count, show_count and
+# next_show_at so listings can sort and filter by activity without
+# aggregating music_show. Writes adjust them in their own transaction, and
+# `flask rollover-shows` moves the shows that started since from upcoming
+# to past.
+
+
+def count_show(venue_id, artist_id, start_time, now=None):
+    # Atomic increments, so concurrent bookings cannot lose an update.
+    now = now or datetime.now()
+    for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+        values = {model.show_count: model.show_count + 1}
+        if start_time is not None and start_time > now:
+            values[model.upcoming_show_count] = model.upcoming_show_count + 1
+            values[model.next_show_at] = case(
+                [
+                    (
+                        or_(
+                            model.next_show_at.is_(None),
+                            model.next_show_at > start_time,
+                        ),
+                        start_time,
+                    )
+                ],
+                else_=model.next_show_at,
+            )
+        elif start_time is not None:
+            values[model.past_show_count] = model.past_show_count + 1
+        db.session.query(model).filter(model.id == entity_id).update(
+            values, synchronize_session=False
+        )
+
+
+def recount(model, condition=None, now=None):
+    # Recomputes the counters of the rows matching condition, all of them by
+    # default, with one UPDATE of correlated subqueries. Returns the row count.
+    now = now or datetime.now()
+    owner = getattr(MusicShow, model.__tablename__ + "_id") == model.id
+    upcoming = and_(owner, MusicShow.start_time > now)
+
+    def scalar(column, *conditions):
+        return select([column]).where(and_(*conditions)).as_scalar()
+
+    values = {
+        model.upcoming_show_count: scalar(func.count(MusicShow.id), upcoming),
+        model.past_show_count: scalar(
+            func.count(MusicShow.id), owner, MusicShow.start_time <= now
+        ),
+        model.show_count: scalar(func.count(MusicShow.id), owner),
+        model.next_show_at: scalar(func.min(MusicShow.start_time), upcoming),
+    }
+    query = db.session.query(model)
+    if condition is not None:
+        query = query.filter(condition)
+    return query.update(values, synchronize_session=False)
+
+
+def recount_ids(venue_ids=(), artist_ids=(), now=None):
+    for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+        ids = {int(entity_id) for entity_id in ids}
+        if ids:
+            recount(model, model.id.in_(ids), now)
+
+
+def rollover(now=None):
+    # Only the rows whose next show has started can have changed.
+    now = now or datetime.now()
+    rolled = {}
+    for model in (Venue, Artist):
+        rolled[model.__tablename__] = recount(model, model.next_show_at <= now, now)
+    db.session.commit()
+    return rolled
+
+
+@click.command("rollover-shows")
+@with_appcontext
+def rollover_command():
+    """Move the shows that have started from the upcoming to the past counts.
+
+    Run it every few minutes, e.g. from cron or the Heroku Scheduler.
+    """
+    rolled = rollover()
+    if rolled["venue"]:
+        page_cache.invalidate("venues")
+    if rolled["artist"]:
+        page_cache.invalidate("artists")
+    click.echo("{venue} venues and {artist} artists rolled over.".format(**rolled))
@@ -0,0 +1,208 @@
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, or_
+
+from bookings import release
+from cache import page_cache
+from counters import recount_ids
+from models import db, Artist, DeletionJob, MusicShow, Venue, VenueBooking
+
+# A venue or an artist is deleted with its shows, at most DELETE_BATCH_SIZE of
+# them per transaction so that no transaction holds the locks of thousands of
+# rows. Those with no more shows than that, by their show_count, are deleted
+# within the request. The others get a DeletionJob, run by a thread of the
+# worker which commits after every batch. A job interrupted by a restart is
+# resumed by `flask run-deletions` once it has made no progress for
+# DELETE_STALE_AFTER seconds.
+
+ENTITIES = {"venue": Venue, "artist": Artist}
+ACTIVE = ("pending", "running")
+
+
+def delete_batch(entity, entity_id, limit):
+    # Deletes up to limit shows of the entity with their bookings, and
+    # returns their number and the ids of the other side of those shows.
+    column = getattr(MusicShow, entity + "_id")
+    rows = (
+        db.session.query(
+            MusicShow.id, MusicShow.venue_id, MusicShow.artist_id, MusicShow.start_time
+        )
+        .filter(column == entity_id)
+        .limit(limit)
+        .all()
+    )
+    if not rows:
+        return 0, set()
+    MusicShow.query.filter(
+        column == entity_id, MusicShow.id.in_([row.id for row in rows])
+    ).delete(synchronize_session=False)
+    if entity == "venue":
+        artist_ids = {row.artist_id for row in rows}
+        VenueBooking.query.filter(
+            VenueBooking.venue_id == entity_id,
+            VenueBooking.start_time.in_({row.start_time for row in rows}),
+        ).delete(synchronize_session=False)
+        recount_ids(venue_ids=[entity_id], artist_ids=artist_ids)
+        return len(rows), artist_ids
+    venue_ids = {row.venue_id for row in rows}
+    release(venue_ids)
+    recount_ids(venue_ids=venue_ids, artist_ids=[entity_id])
+    return len(rows), venue_ids
+
+
+def delete_rest(entity, entity_id, limit):
+    # The shows left, added since the deletion started at most, go in the
+    # transaction deleting the entity.
+    related = set()
+    while True:
+        count, ids = delete_batch(entity, entity_id, limit)
+        related |= ids
+        if count < limit:
+            break
+    if entity == "venue":
+        VenueBooking.query.filter_by(venue_id=entity_id).delete()
+    ENTITIES[entity].query.filter_by(id=entity_id).delete()
+    return related
+
+
+def claimable(stale_after):
+    # Pending, or running without progress for stale_after seconds.
+    stale = datetime.now() - timedelta(seconds=stale_after)
+    return or_(
+        DeletionJob.status == "pending",
+        and_(DeletionJob.status == "running", DeletionJob.updated_at < stale),
+    )
+
+
+def claim(job_id, stale_after):
+    # Atomic, a job runs in one worker at a time.
+    claimed = DeletionJob.query.filter(
+        DeletionJob.id == job_id, claimable(stale_after)
+    ).update(
+        {"status": "running", "updated_at": datetime.now()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+class Deleter:
+    """Deletes venues and artists with their shows.
+
+    The handlers registered with removed() are called once an entity is gone,
+    with its id and the ids of the other side of its last deleted shows.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+
+    def removed(self, entity):
+        def decorator(handler):
+            self.handlers[entity] = handler
+            return handler
+
+        return decorator
+
+    def delete(self, entity, entity_id):
+        """Delete the entity, at once when it has few shows.
+
+        Returns the id of the DeletionJob deleting it in the background
+        otherwise, or None.
+        """
+        entity_id = int(entity_id)
+        model = ENTITIES[entity]
+        limit = current_app.config["DELETE_BATCH_SIZE"]
+        show_count = (
+            db.session.query(model.show_count).filter(model.id == entity_id).scalar()
+        )
+        if show_count is None:
+            return None
+        if show_count <= limit:
+            related = delete_rest(entity, entity_id, limit)
+            db.session.commit()
+            self.handlers[entity](entity_id, related)
+            return None
+
+        job = DeletionJob.query.filter(
+            DeletionJob.entity == entity,
+            DeletionJob.entity_id == entity_id,
+            DeletionJob.status.in_(ACTIVE),
+        ).first()
+        if job is None:
+            job = DeletionJob(entity=entity, entity_id=entity_id, show_count=show_count)
+            db.session.add(job)
+            db.session.commit()
+        job_id = job.id
+        # A stale job is taken over, a running one left alone.
+        thread = threading.Thread(
+            target=self.run,
+            args=(current_app._get_current_object(), job_id),
+            daemon=True,
+        )
+        thread.start()
+        return job_id
+
+    def run(self, app, job_id):
+        with app.app_context():
+            self.process(job_id)
+
+    def process(self, job_id):
+        """Run the job if it can be claimed, and return whether it was."""
+        config = current_app.config
+        if not claim(job_id, config["DELETE_STALE_AFTER"]):
+            return False
+        job = DeletionJob.query.get(job_id)
+        entity, entity_id = job.entity, job.entity_id
+        limit = config["DELETE_BATCH_SIZE"]
+        other = "artist" if entity == "venue" else "venue"
+        try:
+            while True:
+                count, related = delete_batch(entity, entity_id, limit)
+                job.shows_deleted += count
+                job.updated_at = datetime.now()
+                if count < limit:
+                    break
+                db.session.commit()
+                page_cache.invalidate(
+                    "shows",
+                    "{}:{}".format(entity, entity_id),
+                    *["{}:{}".format(other, other_id) for other_id in related]
+                )
+            related |= delete_rest(entity, entity_id, limit)
+            job.status = "done"
+            job.finished_at = job.updated_at = datetime.now()
+            db.session.commit()
+        except Exception as error:
+            db.session.rollback()
+            current_app.logger.exception("Deletion job %d failed", job_id)
+            job.status = "failed"
+            job.error = str(error)[:500]
+            job.finished_at = job.updated_at = datetime.now()
+            db.session.commit()
+            return True
+        self.handlers[entity](entity_id, related)
+        return True
+
+
+deleter = Deleter()
+
+
+@click.command("run-deletions")
+@with_appcontext
+def run_deletions_command():
+    """Run the pending deletions, and those interrupted by a restart.
+
+    Run it every few minutes, e.g. from cron or the Heroku Scheduler.
+    """
+    job_ids = [
+        row.id
+        for row in db.session.query(DeletionJob.id)
+        .filter(claimable(current_app.config["DELETE_STALE_AFTER"]))
+        .order_by(DeletionJob.id)
+    ]
+    done = sum(deleter.process(job_id) for job_id in job_ids)
+    click.echo("{} deletions run.".format(done))
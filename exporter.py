@@ -0,0 +1,123 @@
+import csv
+import hmac
+import io
+import json
+import sys
+
+import click
+from flask import current_app, request
+from flask.cli import with_appcontext
+
+from models import db, Artist, MusicShow, Venue
+from streaming import gzip_chunks
+
+SHOW_FIELDS = (
+    "show_id",
+    "start_time",
+    "venue_id",
+    "venue_name",
+    "venue_city",
+    "venue_state",
+    "artist_id",
+    "artist_name",
+    "artist_city",
+    "artist_state",
+)
+
+
+def show_rows(batch_size=1000):
+    # yield_per streams the rows through a server-side cursor on Postgres, so
+    # memory stays flat whatever the size of music_show. The plain SELECT
+    # only takes an ACCESS SHARE lock, which blocks nothing but DDL.
+    query = (
+        db.session.query(
+            MusicShow.id.label("show_id"),
+            MusicShow.start_time,
+            MusicShow.venue_id,
+            Venue.name.label("venue_name"),
+            Venue.city.label("venue_city"),
+            Venue.state.label("venue_state"),
+            MusicShow.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.city.label("artist_city"),
+            Artist.state.label("artist_state"),
+        )
+        .join(Venue, MusicShow.venue_id == Venue.id)
+        .join(Artist, MusicShow.artist_id == Artist.id)
+        .order_by(MusicShow.id)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        row = row._asdict()
+        if row["start_time"] is not None:
+            row["start_time"] = row["start_time"].isoformat()
+        yield row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, separators=(",", ":")) + "\n"
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=SHOW_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+FORMATS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
+
+
+def export_shows(file_format, compress=False):
+    serialize = FORMATS[file_format][0]
+    chunks = serialize(show_rows())
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_authorized():
+    token = current_app.config.get("EXPORT_TOKEN")
+    if not token:
+        return False
+    header = request.headers.get("Authorization", "")
+    return hmac.compare_digest(header, "Bearer " + token)
+
+
+@click.group("export")
+def export_command():
+    """Export the catalog for analytics."""
+
+
+@export_command.command("shows")
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(sorted(FORMATS)),
+    default="ndjson",
+    show_default=True,
+)
+@click.option("--gzip", "compress", is_flag=True, help="Compress the output.")
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Output file, standard output by default.",
+)
+@with_appcontext
+def export_shows_command(file_format, compress, output):
+    """Stream every show joined with its venue and artist."""
+    stream = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        for chunk in export_shows(file_format, compress):
+            stream.write(chunk if compress else chunk.encode("utf-8"))
+    finally:
+        if output:
+            stream.close()
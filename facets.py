@@ -0,0 +1,75 @@
+from sqlalchemy import cast, exists, func, literal_column, select
+
+from cache import page_cache
+from forms import MusicGenre
+from models import db, is_postgres, GenreList
+
+# Filters of the venue and artist listings. Genres are matched with the
+# GIN-indexed array containment on Postgres, and with json_each on SQLite,
+# which stores them as JSON lists. The number of venues or artists per genre
+# is aggregated once and cached under the listing tag, "venues" or
+# "artists", so the writes that invalidate the listings also invalidate it.
+
+FILTERS = ("genre", "city", "state")
+
+
+def genre_values(model):
+    # The genres of every row, as a table joinable with the model table.
+    if is_postgres():
+        values = func.unnest(model.genres).alias("genre")
+        return values, literal_column("genre.genre")
+    values = func.json_each(model.genres).alias("genre")
+    return values, literal_column("genre.value")
+
+
+def has_genre(model, genre):
+    if is_postgres():
+        # Both sides of @> must be varchar[] for the GIN index.
+        return model.genres.contains(cast([genre], GenreList))
+    values, value = genre_values(model)
+    return exists(
+        select([literal_column("1")]).select_from(values).where(value == genre)
+    )
+
+
+def filter_conditions(model, filters):
+    conditions = []
+    if filters.get("genre"):
+        conditions.append(has_genre(model, filters["genre"]))
+    if filters.get("city"):
+        conditions.append(model.city == filters["city"])
+    if filters.get("state"):
+        conditions.append(model.state == filters["state"])
+    return conditions
+
+
+def parse_filters(args):
+    """The listing filters of the request arguments, or None if invalid."""
+    filters = {name: args[name].strip() for name in FILTERS if args.get(name)}
+    genres = {genre.value for genre in MusicGenre}
+    if filters.get("genre") and filters["genre"] not in genres:
+        return None
+    return filters
+
+
+def count_genres(model):
+    values, value = genre_values(model)
+    rows = (
+        db.session.query(value.label("genre"), func.count().label("count"))
+        .select_from(model.__table__, values)
+        .group_by(value)
+    )
+    counts = {row.genre: row.count for row in rows}
+    # In the order of the form, without the genres nobody picked.
+    return [
+        (genre.value, counts[genre.value])
+        for genre in MusicGenre
+        if counts.get(genre.value)
+    ]
+
+
+def genre_facets(model):
+    tag = model.__tablename__ + "s"
+    return page_cache.memoize(
+        "genres:" + model.__tablename__, [tag], lambda: count_genres(model)
+    )
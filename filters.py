@@ -0,0 +1,34 @@
+from datetime import datetime
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+
+DATETIME_FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    # Babel patterns and locales are parsed once and then reused.
+    pattern = DATETIME_FORMATS.get(format, format)
+    return babel.dates.parse_pattern(pattern), babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=16384)
+def format_native_datetime(value, format, locale):
+    # Like babel.dates.format_datetime, naive values are taken as UTC.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=babel.dates.UTC)
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format="medium", locale=babel.dates.LC_TIME):
+    # Shows come out of the database as datetime objects, only strings still
+    # need to be parsed.
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    return format_native_datetime(value, format, locale)
@@ -1,8 +1,15 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField
+from wtforms import (
+    StringField,
+    SelectField,
+    SelectMultipleField,
+    DateTimeField,
+    IntegerField,
+    TextAreaField,
+)
 from wtforms.fields.core import RadioField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms.validators import DataRequired, AnyOf, NumberRange, URL
 import enum
 
 
@@ -12,6 +19,13 @@ class ShowForm(Form):
     start_time = DateTimeField(
         "start_time", validators=[DataRequired()], default=datetime.today()
     )
+    # Minutes, SHOW_DEFAULT_DURATION by default.
+    duration = IntegerField("duration", validators=[NumberRange(min=1)])
+
+
+class BulkShowForm(Form):
+    # One show per line: artist, venue, start time and optionally duration.
+    shows = TextAreaField("shows", validators=[DataRequired()])
 
 
 class MusicGenre(enum.Enum):
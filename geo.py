@@ -0,0 +1,279 @@
+import csv
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import event, func, text
+
+from models import db, is_postgres, Venue
+
+# Venues are located by latitude and longitude, looked up by city and state in
+# the gazetteer file of GAZETTEER_PATH when they are not given. On Postgres
+# with the earthdistance extension, nearest venues are found through the GiST
+# index on ll_to_earth(latitude, longitude). Elsewhere a GridIndex of the
+# venue coordinates, kept in process like the autocomplete index, yields the
+# venues by increasing distance and the database only filters the closest
+# ones down to those with upcoming shows. Distances are in kilometers.
+
+EARTH_RADIUS = 6371.0088
+KM_PER_DEGREE = math.radians(EARTH_RADIUS)
+
+NEAREST_COLUMNS = (
+    Venue.id,
+    Venue.name,
+    Venue.city,
+    Venue.state,
+    Venue.address,
+    Venue.latitude,
+    Venue.longitude,
+    Venue.upcoming_show_count,
+    Venue.next_show_at,
+)
+
+
+def distance(lat1, lng1, lat2, lng2):
+    # Haversine great-circle distance.
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path):
+    places = {}
+    with open(path, newline="", encoding="utf-8") as stream:
+        for row in csv.DictReader(stream):
+            key = (row["city"].strip().lower(), row["state"].strip().upper())
+            places[key] = (float(row["latitude"]), float(row["longitude"]))
+    return places
+
+
+def locate(city, state):
+    """The (latitude, longitude) of a city in the gazetteer, or None."""
+    if not city or not state:
+        return None
+    places = load_gazetteer(current_app.config["GAZETTEER_PATH"])
+    return places.get((city.strip().lower(), state.strip().upper()))
+
+
+def geocode(venue):
+    # Places venues without coordinates in the center of their city.
+    if venue.latitude is None or venue.longitude is None:
+        place = locate(venue.city, venue.state)
+        if place is not None:
+            venue.latitude, venue.longitude = place
+
+
+class GridIndex:
+    """In-process grid of points, used when earthdistance is not available.
+
+    Points are bucketed in cells of cell_size degrees. A search scans rings of
+    cells around the origin and yields the points found once no point beyond
+    the scanned square can be closer, so in increasing distance order.
+    """
+
+    def __init__(self, cell_size=0.25):
+        self.cell_size = cell_size
+        self._cells = defaultdict(dict)
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def add(self, point_id, lat, lng):
+        with self._lock:
+            self._remove(point_id)
+            if lat is None or lng is None:
+                return
+            self._points[point_id] = (lat, lng)
+            self._cells[self._cell(lat, lng)][point_id] = (lat, lng)
+
+    def remove(self, point_id):
+        with self._lock:
+            self._remove(point_id)
+
+    def _remove(self, point_id):
+        point = self._points.pop(point_id, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        del self._cells[cell][point_id]
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def _ring(self, row, column, ring):
+        if ring == 0:
+            yield row, column
+            return
+        for other in range(column - ring, column + ring + 1):
+            yield row - ring, other
+            yield row + ring, other
+        for other in range(row - ring + 1, row + ring):
+            yield other, column - ring
+            yield other, column + ring
+
+    def _bound(self, lat, lng, row, column, ring):
+        # No point outside the scanned square is closer than its nearest edge:
+        # a parallel, or the great circle of a meridian.
+        size = self.cell_size
+        parallel = min(lat - (row - ring) * size, (row + ring + 1) * size - lat)
+        bound = parallel * KM_PER_DEGREE
+        offset = min(lng - (column - ring) * size, (column + ring + 1) * size - lng)
+        if offset < 90:
+            meridian = math.asin(
+                math.cos(math.radians(lat)) * math.sin(math.radians(offset))
+            )
+            bound = min(bound, meridian * EARTH_RADIUS)
+        return bound
+
+    def nearest(self, lat, lng, radius):
+        """Yield the (distance, id) of the points within radius, closest first."""
+        row, column = self._cell(lat, lng)
+        rings = math.ceil(360 / self.cell_size)
+        heap = []
+        seen = 0
+        for ring in range(rings + 1):
+            with self._lock:
+                found = [
+                    item
+                    for cell in self._ring(row, column, ring)
+                    for item in self._cells.get(cell, {}).items()
+                ]
+                total = len(self._points)
+            for point_id, (point_lat, point_lng) in found:
+                point_distance = distance(lat, lng, point_lat, point_lng)
+                if point_distance <= radius:
+                    heapq.heappush(heap, (point_distance, point_id))
+            seen += len(found)
+            bound = self._bound(lat, lng, row, column, ring)
+            done = seen >= total or bound > radius or ring == rings
+            while heap and (done or heap[0][0] <= bound):
+                yield heapq.heappop(heap)
+            if done:
+                return
+
+
+@lru_cache(maxsize=None)
+def _has_earthdistance(url):
+    return bool(
+        db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'earthdistance'")
+        ).scalar()
+    )
+
+
+def has_earthdistance():
+    return is_postgres() and _has_earthdistance(str(db.engine.url))
+
+
+@event.listens_for(Venue.__table__, "after_create")
+def create_earth_index(target, connection, **kw):
+    # Like the migration, only where the extension can be installed.
+    if connection.dialect.name != "postgresql":
+        return
+    available = connection.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'earthdistance'")
+    ).scalar()
+    if available:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS cube"))
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS earthdistance"))
+        connection.execute(
+            text(
+                "CREATE INDEX ix_venue_earth ON venue "
+                "USING gist (ll_to_earth(latitude, longitude))"
+            )
+        )
+
+
+class VenueLocator:
+    """Nearest venues with upcoming shows.
+
+    Without earthdistance the grid index is loaded on first use, or before
+    forking the workers, and kept current by the venue write handlers in
+    app.py. It is rebuilt once older than GEO_INDEX_MAX_AGE seconds to pick up
+    the writes of the other workers and the imports.
+    """
+
+    def __init__(self):
+        self.index = GridIndex()
+        self.loaded_at = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        index = GridIndex(current_app.config["GEO_GRID_CELL_SIZE"])
+        rows = db.session.query(Venue.id, Venue.latitude, Venue.longitude).filter(
+            Venue.latitude.isnot(None), Venue.longitude.isnot(None)
+        )
+        for row in rows:
+            index.add(row.id, row.latitude, row.longitude)
+        self.index = index
+        self.loaded_at = time.monotonic()
+
+    def _refresh(self):
+        max_age = current_app.config.get("GEO_INDEX_MAX_AGE")
+        loaded_at = self.loaded_at
+        if loaded_at is not None and (
+            not max_age or time.monotonic() - loaded_at < max_age
+        ):
+            return
+        with self._load_lock:
+            if self.loaded_at is loaded_at:
+                self.load()
+
+    def add(self, venue):
+        self.index.add(venue.id, venue.latitude, venue.longitude)
+
+    def remove(self, venue_id):
+        self.index.remove(int(venue_id))
+
+    def nearest(self, lat, lng, radius, limit):
+        """The limit venues with upcoming shows closest to (lat, lng) within
+        radius kilometers, as dicts with their distance, closest first.
+        """
+        if has_earthdistance():
+            return self._nearest_postgres(lat, lng, radius, limit)
+        self._refresh()
+        venues = []
+        candidates = self.index.nearest(lat, lng, radius)
+        # Most venues close by have upcoming shows, so a few batches suffice.
+        while len(venues) < limit:
+            batch = dict(
+                (venue_id, venue_distance)
+                for venue_distance, venue_id in islice(candidates, 2 * limit)
+            )
+            if not batch:
+                break
+            rows = db.session.query(*NEAREST_COLUMNS).filter(
+                Venue.id.in_(list(batch)), Venue.upcoming_show_count > 0
+            )
+            found = [dict(row._asdict(), distance=batch[row.id]) for row in rows]
+            venues.extend(sorted(found, key=lambda venue: venue["distance"]))
+        return venues[:limit]
+
+    def _nearest_postgres(self, lat, lng, radius, limit):
+        origin = func.ll_to_earth(lat, lng)
+        location = func.ll_to_earth(Venue.latitude, Venue.longitude)
+        meters = func.earth_distance(origin, location)
+        rows = (
+            db.session.query(*NEAREST_COLUMNS, (meters / 1000.0).label("distance"))
+            .filter(
+                func.earth_box(origin, radius * 1000.0).op("@>")(location),
+                meters <= radius * 1000.0,
+                Venue.upcoming_show_count > 0,
+            )
+            .order_by(meters, Venue.id)
+            .limit(limit)
+        )
+        return [row._asdict() for row in rows]
+
+
+venue_locator = VenueLocator()
@@ -0,0 +1,50 @@
+"""Gunicorn settings, read from the working directory by `gunicorn wsgi:app`.
+
+The application is imported and warmed up once in the master, then the
+workers are forked from it and share those pages copy-on-write.
+"""
+
+import multiprocessing
+import os
+
+bind = "0.0.0.0:{}".format(os.environ.get("PORT", "8000"))
+preload_app = True
+
+# Requests mostly wait on the database, so each process serves a few of them
+# on threads. WEB_CONCURRENCY is set by Heroku from the dyno size.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Sized from the threads, read by config.py when wsgi.py is imported: one
+# pooled connection per thread and as many in overflow, for the page cache
+# versions read beside a request's own connection (see cache.py). The
+# workers may then open workers * (DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW)
+# connections to the primary, and as many to each replica. Keep that, with
+# a few for the CLI commands, under the max_connections of Postgres (100 by
+# default), or set DATABASE_PGBOUNCER=1 behind PgBouncer.
+os.environ.setdefault("DATABASE_POOL_SIZE", str(threads))
+os.environ.setdefault("DATABASE_MAX_OVERFLOW", str(threads))
+
+# Recycle the workers now and then, which bounds the in-process caches.
+max_requests = 5000
+max_requests_jitter = 500
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    if os.environ.get("DATABASE_PGBOUNCER") == "1":
+        return
+    server.log.info(
+        "Up to %d database connections per database",
+        workers
+        * (
+            int(os.environ["DATABASE_POOL_SIZE"])
+            + int(os.environ["DATABASE_MAX_OVERFLOW"])
+        ),
+    )
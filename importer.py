@@ -0,0 +1,333 @@
+import csv
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+
+import click
+import dateutil.parser
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+
+from bookings import book_rows, check_bookings
+from cache import page_cache
+from counters import recount_ids
+from forms import MusicGenre
+from geo import locate
+from models import db, is_postgres, Artist, MusicShow, Venue
+
+MODELS = {"venues": Venue, "artists": Artist, "shows": MusicShow}
+
+# Columns that must be present besides the non-nullable ones of the model.
+REQUIRED = {"venues": ("name",), "artists": ("name",), "shows": ("start_time",)}
+
+GENRES = {genre.value for genre in MusicGenre}
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"0", "false", "no", "n", "f", ""}
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, file_format):
+    # Yields (line number, row) pairs without ever holding the whole file.
+    with open(path, newline="", encoding="utf-8") as stream:
+        if file_format == "csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as error:
+                        yield line_number, RowError("invalid JSON: {}".format(error))
+
+
+def convert(column, value):
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        return None
+
+    # Variants such as GenreList report the type of their default impl.
+    python_type = getattr(column.type, "impl", column.type).python_type
+    if python_type is list:
+        if isinstance(value, str):
+            value = [genre.strip() for genre in value.split(";") if genre.strip()]
+        unknown = set(value) - GENRES
+        if unknown:
+            raise RowError("unknown genres: {}".format(", ".join(sorted(unknown))))
+        return list(value)
+    if python_type is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in TRUE_VALUES:
+            return True
+        if str(value).lower() in FALSE_VALUES:
+            return False
+        raise RowError("{} is not a boolean".format(column.name))
+    if python_type is int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise RowError("{} is not an integer".format(column.name))
+    if python_type is float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise RowError("{} is not a number".format(column.name))
+    if python_type is datetime:
+        try:
+            value = dateutil.parser.parse(str(value))
+        except (OverflowError, ValueError):
+            raise RowError("{} is not a date".format(column.name))
+        if value.tzinfo is not None:
+            # Dates are stored in naive local time, as the forms enter them.
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+
+    value = str(value)
+    length = getattr(column.type, "length", None)
+    if length and len(value) > length:
+        raise RowError("{} is longer than {} characters".format(column.name, length))
+    return value
+
+
+def validate(kind, row):
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("a row must be an object")
+    model = MODELS[kind]
+    values = {}
+    for column in model.__table__.columns:
+        if column.name in row:
+            values[column.name] = convert(column, row[column.name])
+    if kind == "shows":
+        for name in ("venue_name", "artist_name"):
+            if row.get(name):
+                values[name] = str(row[name]).strip()
+
+    for column in model.__table__.columns:
+        if column.primary_key or column.nullable or column.server_default:
+            continue
+        # Shows may reference their venue and artist by name instead.
+        by_name = column.name.replace("_id", "_name")
+        if values.get(column.name) is None and not values.get(by_name):
+            raise RowError("{} is required".format(column.name))
+    for name in REQUIRED[kind]:
+        if values.get(name) is None:
+            raise RowError("{} is required".format(name))
+    if kind == "venues" and (
+        values.get("latitude") is None or values.get("longitude") is None
+    ):
+        place = locate(values.get("city"), values.get("state"))
+        if place is not None:
+            values["latitude"], values["longitude"] = place
+    return values
+
+
+def lookup_ids(model, ids, names):
+    # One IN query per table and kind of reference for the whole batch.
+    found_ids = set()
+    if ids:
+        rows = db.session.query(model.id).filter(model.id.in_(ids))
+        found_ids = {row.id for row in rows}
+    by_name = {}
+    if names:
+        rows = db.session.query(model.id, model.name).filter(model.name.in_(names))
+        for row in rows:
+            # Names shared by several rows are ambiguous and left unresolved.
+            by_name[row.name] = None if row.name in by_name else row.id
+    return found_ids, by_name
+
+
+def resolve_shows(batch):
+    venue_ids, venue_names = lookup_ids(
+        Venue,
+        {row["venue_id"] for _, row in batch if row.get("venue_id") is not None},
+        {row["venue_name"] for _, row in batch if row.get("venue_name")},
+    )
+    artist_ids, artist_names = lookup_ids(
+        Artist,
+        {row["artist_id"] for _, row in batch if row.get("artist_id") is not None},
+        {row["artist_name"] for _, row in batch if row.get("artist_name")},
+    )
+
+    resolved = []
+    rejected = []
+    for line_number, row in batch:
+        try:
+            for key, ids, names in (
+                ("venue", venue_ids, venue_names),
+                ("artist", artist_ids, artist_names),
+            ):
+                entity_id = row.pop(key + "_id", None)
+                name = row.pop(key + "_name", None)
+                if entity_id is None:
+                    entity_id = names.get(name)
+                    if entity_id is None:
+                        raise RowError("unknown or ambiguous {} {!r}".format(key, name))
+                elif entity_id not in ids:
+                    raise RowError("unknown {} id {}".format(key, entity_id))
+                row[key + "_id"] = entity_id
+            resolved.append((line_number, row))
+        except RowError as error:
+            rejected.append((line_number, str(error), row))
+    return resolved, rejected
+
+
+def check_shows(batch):
+    # Duplicate shows and shows overlapping another of the batch or a
+    # booking, for their default duration, are rejected before the insert.
+    duration = timedelta(minutes=current_app.config["SHOW_DEFAULT_DURATION"])
+    rows = dict(batch)
+    accepted, conflicts = check_bookings(
+        [
+            (line_number, dict(row, end_time=row["start_time"] + duration))
+            for line_number, row in batch
+        ]
+    )
+    return (
+        [(line_number, rows[line_number]) for line_number, _ in accepted],
+        [(line_number, error, rows[line_number]) for line_number, error in conflicts],
+    )
+
+
+def execute_insert(model, batch):
+    # One executemany per set of columns: JSON lines rows may omit some.
+    shapes = {}
+    for _, row in batch:
+        shapes.setdefault(frozenset(row), []).append(row)
+    for rows in shapes.values():
+        db.session.execute(model.__table__.insert(), rows)
+    if model is MusicShow:
+        # Shows booked concurrently since check_shows are rejected by the
+        # constraint, one at a time like the other failing rows.
+        book_rows([row for _, row in batch])
+        recount_ids(
+            {row["venue_id"] for _, row in batch},
+            {row["artist_id"] for _, row in batch},
+        )
+    db.session.commit()
+
+
+def insert_batch(kind, batch):
+    model = MODELS[kind]
+    rejected = []
+    if kind == "shows":
+        batch, rejected = resolve_shows(batch)
+        batch, conflicts = check_shows(batch)
+        rejected.extend(conflicts)
+    try:
+        execute_insert(model, batch)
+    except IntegrityError:
+        # Find the offending rows, e.g. duplicate ids, one at a time so the
+        # rest of the batch still goes in.
+        db.session.rollback()
+        inserted = []
+        for line_number, row in batch:
+            try:
+                execute_insert(model, [(line_number, row)])
+                inserted.append((line_number, row))
+            except IntegrityError as error:
+                db.session.rollback()
+                rejected.append((line_number, str(error.orig), row))
+        batch = inserted
+
+    if kind == "shows":
+        page_cache.invalidate(
+            "venues",
+            "artists",
+            "shows",
+            *{"venue:{}".format(row["venue_id"]) for _, row in batch},
+            *{"artist:{}".format(row["artist_id"]) for _, row in batch}
+        )
+    else:
+        page_cache.invalidate(kind)
+    return len(batch), rejected
+
+
+def reset_sequence(model):
+    # Rows imported with explicit ids do not advance the Postgres sequence.
+    if is_postgres():
+        table = model.__tablename__
+        db.session.execute(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+            "(SELECT COALESCE(MAX(id), 1) FROM {}))".format(table),
+            {"table": table},
+        )
+        db.session.commit()
+
+
+def import_file(kind, path, file_format, batch_size, on_progress, on_reject):
+    stats = {"read": 0, "imported": 0, "rejected": 0}
+    rows = read_rows(path, file_format)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for line_number, row in chunk:
+            try:
+                batch.append((line_number, validate(kind, row)))
+            except RowError as error:
+                on_reject(line_number, str(error), row)
+                stats["rejected"] += 1
+        imported, rejected = insert_batch(kind, batch)
+        for line_number, error, row in rejected:
+            on_reject(line_number, error, row)
+        stats["read"] += len(chunk)
+        stats["imported"] += imported
+        stats["rejected"] += len(rejected)
+        on_progress(stats)
+    reset_sequence(MODELS[kind])
+    return stats
+
+
+@click.command("import")
+@click.argument("kind", type=click.Choice(sorted(MODELS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["csv", "jsonl"]),
+    help="Input format, guessed from the file extension by default.",
+)
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option(
+    "--rejects",
+    type=click.File("w"),
+    help="Write rejected rows to this file as JSON lines.",
+)
+@with_appcontext
+def import_command(kind, path, file_format, batch_size, rejects):
+    """Stream venues, artists or shows from a CSV or JSON lines file.
+
+    Rows are validated against the models and inserted in batches. Shows
+    reference their venue and artist by venue_id/artist_id or by
+    venue_name/artist_name. Genres in CSV files are separated by ";".
+    """
+    if file_format is None:
+        file_format = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+    def on_progress(stats):
+        click.echo(
+            "{}: {read} read, {imported} imported, {rejected} rejected".format(
+                kind, **stats
+            )
+        )
+
+    def on_reject(line_number, error, row):
+        if rejects is not None:
+            if isinstance(row, RowError):
+                row = None
+            record = {"line": line_number, "error": error, "row": row}
+            rejects.write(json.dumps(record, default=str) + "\n")
+        else:
+            click.echo("line {}: {}".format(line_number, error), err=True)
+
+    import_file(kind, path, file_format, batch_size, on_progress, on_reject)
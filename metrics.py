@@ -0,0 +1,248 @@
+import threading
+import time
+from bisect import bisect_left
+from functools import partial
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            # The last slot counts the observations above every bound.
+            counts, total = self._series.get(
+                endpoint, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[endpoint] = (counts, total + value)
+
+    def expose(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        with self._lock:
+            series = [
+                (endpoint, list(counts), total)
+                for endpoint, (counts, total) in sorted(self._series.items())
+            ]
+        for endpoint, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(
+                    '{}_bucket{{endpoint="{}",le="{}"}} {}'.format(
+                        self.name, endpoint, bound, cumulative
+                    )
+                )
+            lines.append(
+                '{}_sum{{endpoint="{}"}} {}'.format(self.name, endpoint, total)
+            )
+            lines.append(
+                '{}_count{{endpoint="{}"}} {}'.format(self.name, endpoint, cumulative)
+            )
+        return lines
+
+
+class QueryMetrics:
+    """Per-request SQL statement counts, database time and rows.
+
+    Rows are those fetched by SELECT statements, counted as the cursor
+    returns them, plus those written by the other statements.
+
+    The numbers are sent back in a Server-Timing header, aggregated into
+    per-endpoint histograms served in the Prometheus text format on /metrics,
+    and a warning is logged when a request issues more statements than its
+    budget (SQL_QUERY_BUDGET, or SQL_QUERY_BUDGETS for a given endpoint).
+
+    Histograms are kept per process; scrape every worker or run one.
+    """
+
+    def __init__(self, app=None):
+        self.request_duration = Histogram(
+            "fyyur_request_duration_seconds",
+            "Time spent handling a request.",
+            DURATION_BUCKETS,
+        )
+        self.sql_duration = Histogram(
+            "fyyur_request_sql_duration_seconds",
+            "Time spent in SQL statements per request.",
+            DURATION_BUCKETS,
+        )
+        self.sql_statements = Histogram(
+            "fyyur_request_sql_statements",
+            "SQL statements issued per request.",
+            STATEMENT_BUCKETS,
+        )
+        self.sql_rows = Histogram(
+            "fyyur_request_sql_rows",
+            "Rows fetched or written by SQL statements per request.",
+            ROW_BUCKETS,
+        )
+        self.histograms = (
+            self.request_duration,
+            self.sql_duration,
+            self.sql_statements,
+            self.sql_rows,
+        )
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SQL_QUERY_BUDGET", 10)
+        app.config.setdefault("SQL_QUERY_BUDGETS", {})
+        app.config.setdefault("METRICS_ENDPOINT", True)
+
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        if app.config["METRICS_ENDPOINT"]:
+            app.add_url_rule("/metrics", "metrics", self.metrics_view)
+        # Listening on the Engine class covers every bind, replicas included.
+        if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+            event.listen(Engine, "handle_error", handle_error)
+        app.extensions["query_metrics"] = self
+
+    def start_request(self):
+        g.sql_metrics = {"statements": 0, "duration": 0.0, "rows": 0}
+        g.request_started = time.perf_counter()
+
+    def finish_request(self, response):
+        sql = g.get("sql_metrics")
+        started = g.get("request_started")
+        if sql is None or started is None:
+            return response
+        duration = time.perf_counter() - started
+
+        # Up to the headers for streamed responses, whose rows are read later
+        # and only counted in the histogram.
+        description = "{} statements".format(sql["statements"])
+        if not response.is_streamed:
+            description += ", {} rows".format(sql["rows"])
+        response.headers.add(
+            "Server-Timing",
+            'db;dur={:.2f};desc="{}"'.format(sql["duration"] * 1000, description),
+        )
+        response.headers.add("Server-Timing", "app;dur={:.2f}".format(duration * 1000))
+
+        record = partial(
+            self.record,
+            current_app._get_current_object(),
+            request.endpoint or "none",
+            "{} {}".format(request.method, request.path),
+            sql,
+            started,
+        )
+        if response.is_streamed:
+            # The statements reading the rows of a streamed page run while it
+            # is sent, still counted in sql since the request context is kept.
+            response.call_on_close(record)
+        else:
+            record()
+        return response
+
+    def record(self, app, endpoint, description, sql, started):
+        self.request_duration.observe(endpoint, time.perf_counter() - started)
+        self.sql_duration.observe(endpoint, sql["duration"])
+        self.sql_statements.observe(endpoint, sql["statements"])
+        self.sql_rows.observe(endpoint, sql["rows"])
+
+        config = app.config
+        budget = config["SQL_QUERY_BUDGETS"].get(endpoint, config["SQL_QUERY_BUDGET"])
+        if budget is not None and sql["statements"] > budget:
+            app.logger.warning(
+                "%s issued %d SQL statements, over its budget of %d",
+                description,
+                sql["statements"],
+                budget,
+            )
+
+    def metrics_view(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.expose())
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+class CountingCursor:
+    """DBAPI cursor adding the rows it returns to the metrics of a request.
+
+    Server-side cursors, as used by yield_per on Postgres, and SQLite do not
+    report the rows of a SELECT in rowcount, so they are counted as fetched.
+    """
+
+    def __init__(self, cursor, sql):
+        self._cursor = cursor
+        self._sql = sql
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._sql["rows"] += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._sql["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._sql["rows"] += len(rows)
+        return rows
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    if not has_app_context():
+        return
+    sql = g.get("sql_metrics")
+    if sql is None:
+        return
+    sql["statements"] += 1
+    sql["duration"] += time.perf_counter() - started
+    if context is None or isinstance(cursor, CountingCursor):
+        return
+    if (
+        context.isinsert
+        or context.isupdate
+        or context.isdelete
+        or (context.is_text and cursor.description is None)
+    ):
+        # Rows written, -1 when the driver does not know.
+        sql["rows"] += max(cursor.rowcount, 0)
+    elif context.cursor is cursor:
+        # The result reads its rows from context.cursor once this returns.
+        # A server-side cursor has no description until its first fetch.
+        context.cursor = CountingCursor(cursor, sql)
+
+
+def handle_error(context):
+    # A failed statement never reaches after_cursor_execute.
+    started = context.connection.info.get("query_started")
+    if started:
+        started.pop()
+
+
+query_metrics = QueryMetrics()
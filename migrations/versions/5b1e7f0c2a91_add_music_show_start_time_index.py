@@ -0,0 +1,28 @@
+"""add music_show (start_time, id) index for the shows feed
+
+Revision ID: 5b1e7f0c2a91
+Revises:
+Create Date: 2026-10-17 09:12:40.118302
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "5b1e7f0c2a91"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_music_show_start_time_id",
+        "music_show",
+        ["start_time", "id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_music_show_start_time_id", table_name="music_show")
@@ -0,0 +1,35 @@
+"""add music_show (venue_id, start_time) and (artist_id, start_time) indexes
+
+Revision ID: 9d4c2e81b7f3
+Revises: 5b1e7f0c2a91
+Create Date: 2026-10-17 10:03:11.482917
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "9d4c2e81b7f3"
+down_revision = "5b1e7f0c2a91"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_music_show_venue_id_start_time",
+        "music_show",
+        ["venue_id", "start_time"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_music_show_artist_id_start_time",
+        "music_show",
+        ["artist_id", "start_time"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_music_show_artist_id_start_time", table_name="music_show")
+    op.drop_index("ix_music_show_venue_id_start_time", table_name="music_show")
@@ -0,0 +1,77 @@
+"""add venue_booking with a no-overlap exclusion constraint
+
+Revision ID: a6d2f4b8c913
+Revises: f1a7c3e9b052
+Create Date: 2026-10-17 18:05:42.660318
+
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a6d2f4b8c913"
+down_revision = "f1a7c3e9b052"
+branch_labels = None
+depends_on = None
+
+# SHOW_DEFAULT_DURATION when this migration was written.
+DEFAULT_DURATION = timedelta(minutes=120)
+
+
+def upgrade():
+    booking = op.create_table(
+        "venue_booking",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("venue_id", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("end_time", sa.DateTime(), nullable=False),
+        sa.CheckConstraint("end_time > start_time", name="ck_venue_booking_range"),
+        sa.ForeignKeyConstraint(["venue_id"], ["venue.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_venue_booking_venue_id_start_time",
+        "venue_booking",
+        ["venue_id", "start_time"],
+        unique=True,
+    )
+
+    # Existing shows book their venue for the default duration, cut short by
+    # the next show there so that they do not overlap.
+    show = sa.table(
+        "music_show",
+        sa.column("venue_id", sa.Integer),
+        sa.column("start_time", sa.DateTime),
+    )
+    starts = op.get_bind().execute(
+        sa.select([show.c.venue_id, show.c.start_time])
+        .where(show.c.start_time.isnot(None))
+        .distinct()
+        .order_by(show.c.venue_id, show.c.start_time)
+    )
+    rows = []
+    for venue_id, group in groupby(starts, key=lambda row: row.venue_id):
+        times = [row.start_time for row in group]
+        for start, following in zip(times, times[1:] + [None]):
+            end = start + DEFAULT_DURATION
+            if following is not None:
+                end = min(end, following)
+            rows.append({"venue_id": venue_id, "start_time": start, "end_time": end})
+    if rows:
+        op.bulk_insert(booking, rows)
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            "ALTER TABLE venue_booking ADD CONSTRAINT venue_booking_no_overlap "
+            "EXCLUDE USING gist (int4range(venue_id, venue_id, '[]') WITH &&, "
+            "tsrange(start_time, end_time) WITH &&)"
+        )
+
+
+def downgrade():
+    op.drop_index("ix_venue_booking_venue_id_start_time", table_name="venue_booking")
+    op.drop_table("venue_booking")
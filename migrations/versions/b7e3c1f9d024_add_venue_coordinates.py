@@ -0,0 +1,75 @@
+"""add venue latitude and longitude, filled from the gazetteer
+
+Revision ID: b7e3c1f9d024
+Revises: a6d2f4b8c913
+Create Date: 2026-10-17 20:41:09.118530
+
+"""
+import csv
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7e3c1f9d024"
+down_revision = "a6d2f4b8c913"
+branch_labels = None
+depends_on = None
+
+GAZETTEER_PATH = os.environ.get(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "gazetteer.csv"),
+)
+
+
+def upgrade():
+    op.add_column("venue", sa.Column("latitude", sa.Float(), nullable=True))
+    op.add_column("venue", sa.Column("longitude", sa.Float(), nullable=True))
+
+    # Every venue of a city in the gazetteer is placed in its center, with one
+    # update per city. No network geocoding.
+    with open(GAZETTEER_PATH, newline="", encoding="utf-8") as stream:
+        places = [
+            {
+                "city": row["city"].strip().lower(),
+                "state": row["state"].strip().upper(),
+                "latitude": float(row["latitude"]),
+                "longitude": float(row["longitude"]),
+            }
+            for row in csv.DictReader(stream)
+        ]
+    if places:
+        op.get_bind().execute(
+            sa.text(
+                "UPDATE venue SET latitude = :latitude, longitude = :longitude "
+                "WHERE lower(trim(city)) = :city AND upper(trim(state)) = :state"
+            ),
+            places,
+        )
+
+    # Radius searches use earthdistance where it can be installed, and an
+    # in-process grid index otherwise, see geo.py.
+    bind = op.get_bind()
+    if (
+        bind.dialect.name == "postgresql"
+        and bind.execute(
+            sa.text(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'earthdistance'"
+            )
+        ).scalar()
+    ):
+        op.execute("CREATE EXTENSION IF NOT EXISTS cube")
+        op.execute("CREATE EXTENSION IF NOT EXISTS earthdistance")
+        op.execute(
+            "CREATE INDEX ix_venue_earth ON venue "
+            "USING gist (ll_to_earth(latitude, longitude))"
+        )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_venue_earth")
+    with op.batch_alter_table("venue") as batch_op:
+        batch_op.drop_column("longitude")
+        batch_op.drop_column("latitude")
@@ -0,0 +1,58 @@
+"""add pg_trgm name/city, GIN genre and upper(state) search indexes
+
+Revision ID: c3f8a1d5e2b4
+Revises: 9d4c2e81b7f3
+Create Date: 2026-10-17 11:20:54.301766
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c3f8a1d5e2b4"
+down_revision = "9d4c2e81b7f3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Other databases search through the in-process n-gram index instead.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in ("venue", "artist"):
+        for column in ("name", "city"):
+            op.create_index(
+                "ix_{}_{}_trgm".format(table, column),
+                table,
+                [column],
+                unique=False,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+            )
+        op.create_index(
+            "ix_{}_genres".format(table),
+            table,
+            ["genres"],
+            unique=False,
+            postgresql_using="gin",
+        )
+        op.create_index(
+            "ix_{}_state_upper".format(table),
+            table,
+            [sa.text("upper(state)")],
+            unique=False,
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for table in ("venue", "artist"):
+        op.drop_index("ix_{}_state_upper".format(table), table_name=table)
+        op.drop_index("ix_{}_genres".format(table), table_name=table)
+        for column in ("name", "city"):
+            op.drop_index("ix_{}_{}_trgm".format(table, column), table_name=table)
@@ -0,0 +1,46 @@
+"""add deletion_job, the background deletions of venues and artists
+
+Revision ID: c9a4e2f6b135
+Revises: b7e3c1f9d024
+Create Date: 2026-10-17 23:12:37.402815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c9a4e2f6b135"
+down_revision = "b7e3c1f9d024"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "deletion_job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("entity", sa.String(length=20), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("show_count", sa.Integer(), nullable=False),
+        sa.Column("shows_deleted", sa.Integer(), nullable=False),
+        sa.Column("error", sa.String(length=500), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_deletion_job_entity_entity_id",
+        "deletion_job",
+        ["entity", "entity_id"],
+        unique=False,
+    )
+    op.create_index("ix_deletion_job_status", "deletion_job", ["status"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_deletion_job_status", table_name="deletion_job")
+    op.drop_index("ix_deletion_job_entity_entity_id", table_name="deletion_job")
+    op.drop_table("deletion_job")
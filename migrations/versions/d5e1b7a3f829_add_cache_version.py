@@ -0,0 +1,29 @@
+"""add cache_version, the page cache tag versions shared by the processes
+
+Revision ID: d5e1b7a3f829
+Revises: c9a4e2f6b135
+Create Date: 2026-10-18 09:26:51.640273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d5e1b7a3f829"
+down_revision = "c9a4e2f6b135"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "cache_version",
+        sa.Column("tag", sa.String(length=100), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("tag"),
+    )
+
+
+def downgrade():
+    op.drop_table("cache_version")
@@ -0,0 +1,75 @@
+"""add upcoming/past/total show counters and next_show_at to venue and artist
+
+Revision ID: e4b9d2a7c615
+Revises: c3f8a1d5e2b4
+Create Date: 2026-10-17 15:02:11.540917
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e4b9d2a7c615"
+down_revision = "c3f8a1d5e2b4"
+branch_labels = None
+depends_on = None
+
+COUNTERS = ("upcoming_show_count", "past_show_count", "show_count")
+
+
+def upgrade():
+    for table in ("venue", "artist"):
+        for column in COUNTERS:
+            op.add_column(
+                table,
+                sa.Column(column, sa.Integer(), nullable=False, server_default="0"),
+            )
+        op.add_column(table, sa.Column("next_show_at", sa.DateTime(), nullable=True))
+        op.create_index(
+            "ix_{}_next_show_at".format(table), table, ["next_show_at"], unique=False
+        )
+
+    # Backfill from the existing shows, as counters.recount does.
+    now = datetime.now()
+    show = sa.table(
+        "music_show",
+        sa.column("id", sa.Integer),
+        sa.column("venue_id", sa.Integer),
+        sa.column("artist_id", sa.Integer),
+        sa.column("start_time", sa.DateTime),
+    )
+    for table in ("venue", "artist"):
+        entity = sa.table(
+            table,
+            sa.column("id", sa.Integer),
+            *[sa.column(column, sa.Integer) for column in COUNTERS],
+            sa.column("next_show_at", sa.DateTime)
+        )
+        owner = show.c[table + "_id"] == entity.c.id
+        upcoming = sa.and_(owner, show.c.start_time > now)
+
+        def scalar(column, *conditions):
+            return sa.select([column]).where(sa.and_(*conditions)).as_scalar()
+
+        op.execute(
+            entity.update().values(
+                upcoming_show_count=scalar(sa.func.count(show.c.id), upcoming),
+                past_show_count=scalar(
+                    sa.func.count(show.c.id), owner, show.c.start_time <= now
+                ),
+                show_count=scalar(sa.func.count(show.c.id), owner),
+                next_show_at=scalar(sa.func.min(show.c.start_time), upcoming),
+            )
+        )
+
+
+def downgrade():
+    for table in ("venue", "artist"):
+        op.drop_index("ix_{}_next_show_at".format(table), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("next_show_at")
+            for column in reversed(COUNTERS):
+                batch_op.drop_column(column)
@@ -0,0 +1,116 @@
+"""range partition music_show by month of start_time
+
+Revision ID: f1a7c3e9b052
+Revises: e4b9d2a7c615
+Create Date: 2026-10-17 16:40:27.118503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f1a7c3e9b052"
+down_revision = "e4b9d2a7c615"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_music_show_start_time_id": ["start_time", "id"],
+    "ix_music_show_venue_id_start_time": ["venue_id", "start_time"],
+    "ix_music_show_artist_id_start_time": ["artist_id", "start_time"],
+}
+
+# One partition per month from the first show to twelve months ahead, as
+# partitions.partition_music_show does; `flask partition-shows` adds the next.
+CREATE_PARTITIONS = """
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(
+                (SELECT min(start_time) FROM music_show_plain), now()
+            )),
+            date_trunc('month', now()) + interval '12 months',
+            interval '1 month'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF music_show FOR VALUES FROM (%L) TO (%L)',
+            'music_show_' || to_char(month, '"y"YYYY"m"MM'),
+            month,
+            month + interval '1 month'
+        );
+    END LOOP;
+END
+$$
+"""
+
+
+def upgrade():
+    # Other databases keep the plain table.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    nulls = op.get_bind().scalar(
+        sa.text("SELECT count(*) FROM music_show WHERE start_time IS NULL")
+    )
+    if nulls:
+        raise RuntimeError(
+            "{} shows have no start_time, set or delete them first.".format(nulls)
+        )
+
+    op.rename_table("music_show", "music_show_plain")
+    op.drop_constraint("music_show_pkey", "music_show_plain")
+    for name in INDEXES:
+        op.drop_index(name, table_name="music_show_plain")
+    # The partition key must be part of the primary key.
+    op.execute(
+        "CREATE TABLE music_show ("
+        "id INTEGER NOT NULL DEFAULT nextval('music_show_id_seq'), "
+        "venue_id INTEGER NOT NULL REFERENCES venue (id), "
+        "artist_id INTEGER NOT NULL REFERENCES artist (id), "
+        "start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+        "PRIMARY KEY (id, start_time)"
+        ") PARTITION BY RANGE (start_time)"
+    )
+    op.execute("CREATE TABLE music_show_default PARTITION OF music_show DEFAULT")
+    op.execute(CREATE_PARTITIONS)
+    for name, columns in INDEXES.items():
+        op.create_index(name, "music_show", columns, unique=False)
+    op.execute("ALTER SEQUENCE music_show_id_seq OWNED BY music_show.id")
+    op.execute(
+        "INSERT INTO music_show (id, venue_id, artist_id, start_time) "
+        "SELECT id, venue_id, artist_id, start_time FROM music_show_plain"
+    )
+    op.drop_table("music_show_plain")
+
+
+def downgrade():
+    # Partitions archived by `flask partition-shows` are left in their schema.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.rename_table("music_show", "music_show_partitioned")
+    op.drop_constraint("music_show_pkey", "music_show_partitioned")
+    for name in INDEXES:
+        op.drop_index(name, table_name="music_show_partitioned")
+    op.execute(
+        "CREATE TABLE music_show ("
+        "id INTEGER NOT NULL DEFAULT nextval('music_show_id_seq'), "
+        "venue_id INTEGER NOT NULL REFERENCES venue (id), "
+        "artist_id INTEGER NOT NULL REFERENCES artist (id), "
+        "start_time TIMESTAMP WITHOUT TIME ZONE, "
+        "PRIMARY KEY (id)"
+        ")"
+    )
+    op.execute("ALTER SEQUENCE music_show_id_seq OWNED BY music_show.id")
+    op.execute(
+        "INSERT INTO music_show (id, venue_id, artist_id, start_time) "
+        "SELECT id, venue_id, artist_id, start_time FROM music_show_partitioned"
+    )
+    op.drop_table("music_show_partitioned")
+    for name, columns in INDEXES.items():
+        op.create_index(name, "music_show", columns, unique=False)
@@ -1,14 +1,75 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
 
-db = SQLAlchemy()
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+# Genres are Postgres arrays. SQLite, used for local and test runs, stores
+# them as a JSON list instead. The Postgres ARRAY type provides the
+# contains and overlap operators.
+GenreList = ARRAY(db.String()).with_variant(db.JSON(), "sqlite")
+
+# The name and city search indexes need the pg_trgm operator classes.
+event.listen(
+    db.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+def is_postgres():
+    return db.engine.dialect.name == "postgresql"
+
+
+def search_indexes(table):
+    return (
+        db.Index(
+            "ix_{}_name_trgm".format(table),
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        db.Index(
+            "ix_{}_city_trgm".format(table),
+            "city",
+            postgresql_using="gin",
+            postgresql_ops={"city": "gin_trgm_ops"},
+        ),
+        db.Index("ix_{}_genres".format(table), "genres", postgresql_using="gin"),
+        # Lets the state match join the others in a bitmap OR.
+        db.Index("ix_{}_state_upper".format(table), db.text("upper(state)")),
+    )
+
+
+def counter_indexes(table):
+    # Lets the rollover find the rows whose next show has started.
+    return (db.Index("ix_{}_next_show_at".format(table), "next_show_at"),)
+
+
+class ShowCounters:
+    # Maintained by counters.py.
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default="0")
+    past_show_count = db.Column(db.Integer, nullable=False, server_default="0")
+    show_count = db.Column(db.Integer, nullable=False, server_default="0")
+    next_show_at = db.Column(db.DateTime)
 
 
 class MusicShow(db.Model):
+    # Partitioned by month of start_time on Postgres, see partitions.py.
     __tablename__ = "music_show"
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey("venue.id"), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey("artist.id"), nullable=False)
-    start_time = db.Column(db.DateTime(120))
+    start_time = db.Column(db.DateTime(120), nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_music_show_start_time_id", "start_time", "id"),
+        db.Index("ix_music_show_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_music_show_artist_id_start_time", "artist_id", "start_time"),
+    )
 
     def __repr__(self):
         return "<MusicShow: {}, {}, {}, {}>".format(
@@ -16,8 +77,43 @@ class MusicShow(db.Model):
         )
 
 
-class Venue(db.Model):
+class VenueBooking(db.Model):
+    # The time a show occupies its venue, see bookings.py.
+    __tablename__ = "venue_booking"
+    id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(
+        db.Integer, db.ForeignKey("venue.id", ondelete="CASCADE"), nullable=False
+    )
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index(
+            "ix_venue_booking_venue_id_start_time",
+            "venue_id",
+            "start_time",
+            unique=True,
+        ),
+        db.CheckConstraint("end_time > start_time", name="ck_venue_booking_range"),
+    )
+
+
+# Bookings of a venue may not overlap. Comparing venue_id as single value
+# ranges lets GiST index both columns without the btree_gist extension.
+event.listen(
+    VenueBooking.__table__,
+    "after_create",
+    DDL(
+        "ALTER TABLE venue_booking ADD CONSTRAINT venue_booking_no_overlap "
+        "EXCLUDE USING gist (int4range(venue_id, venue_id, '[]') WITH &&, "
+        "tsrange(start_time, end_time) WITH &&)"
+    ).execute_if(dialect="postgresql"),
+)
+
+
+class Venue(ShowCounters, db.Model):
     __tablename__ = "venue"
+    __table_args__ = search_indexes("venue") + counter_indexes("venue")
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -25,10 +121,13 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String())
+    # Degrees, from the gazetteer when not given, see geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
 
     shows = db.relationship("MusicShow", backref="venue", lazy=True)
 
@@ -49,16 +148,17 @@ class Venue(db.Model):
 
 # DONE: Implement Show and Artist models, and complete all model relationships and
 #       properties, as a database migration.
-class Artist(db.Model):
+class Artist(ShowCounters, db.Model):
     # DONE: implement any missing fields, as a database migration using Flask-Migrate
     __tablename__ = "artist"
+    __table_args__ = search_indexes("artist") + counter_indexes("artist")
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
@@ -78,3 +178,32 @@ class Artist(db.Model):
             self.image_link,
             self.facebook_link,
         )
+
+
+class DeletionJob(db.Model):
+    # A venue or an artist deleted with its shows in the background, see
+    # deletions.py.
+    __tablename__ = "deletion_job"
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    show_count = db.Column(db.Integer, nullable=False)
+    shows_deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_deletion_job_entity_entity_id", "entity", "entity_id"),
+        db.Index("ix_deletion_job_status", "status"),
+    )
+
+
+class CacheVersion(db.Model):
+    # Version of a page cache tag, bumped to invalidate the pages cached under
+    # it in every process, see cache.py.
+    __tablename__ = "cache_version"
+    tag = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
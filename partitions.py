@@ -0,0 +1,246 @@
+import re
+from datetime import date, datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, text
+
+from cache import page_cache
+from counters import recount_ids
+from models import db, is_postgres, MusicShow
+
+# On Postgres music_show is range partitioned by start_time, one
+# music_show_yYYYYmMM table per month plus music_show_default for the shows
+# booked beyond the last month. Queries bounded on start_time only scan the
+# months they overlap. `flask partition-shows` creates the months ahead and
+# archives the old ones. Other databases keep music_show as a plain table.
+
+PARTITION_NAME = re.compile(r"^music_show_y(\d{4})m(\d{2})$")
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return "music_show_y{:04d}m{:02d}".format(month.year, month.month)
+
+
+def is_partitioned(connection):
+    kind = connection.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = 'music_show'::regclass")
+    ).scalar()
+    return kind == "p"
+
+
+def partitions(connection):
+    # The attached monthly partitions by their first day.
+    names = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'music_show'::regclass"
+        )
+    )
+    months = {}
+    for (name,) in names:
+        match = PARTITION_NAME.match(name)
+        if match is not None:
+            months[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return months
+
+
+def create_partition(connection, month):
+    # Shows already booked in that month wait in the default partition: they
+    # are moved to the new table before it is attached.
+    name = partition_name(month)
+    bounds = {"start": month, "end": add_months(month, 1)}
+    connection.execute(
+        text("CREATE TABLE {} (LIKE music_show INCLUDING DEFAULTS)".format(name))
+    )
+    connection.execute(
+        text(
+            "WITH moved AS (DELETE FROM music_show_default "
+            "WHERE start_time >= :start AND start_time < :end "
+            "RETURNING id, venue_id, artist_id, start_time) "
+            "INSERT INTO {} (id, venue_id, artist_id, start_time) "
+            "SELECT * FROM moved".format(name)
+        ),
+        bounds,
+    )
+    # Partition bounds must be literals.
+    connection.execute(
+        text(
+            "ALTER TABLE music_show ATTACH PARTITION {} "
+            "FOR VALUES FROM ('{start}') TO ('{end}')".format(name, **bounds)
+        )
+    )
+    return name
+
+
+def archive_partition(connection, name, schema):
+    # Detached, the shows of that month leave the pages and the counters but
+    # stay queryable as <schema>.<name>.
+    venue_ids, artist_ids = connection.execute(
+        text(
+            "SELECT array_agg(DISTINCT venue_id), array_agg(DISTINCT artist_id) "
+            "FROM {}".format(name)
+        )
+    ).first()
+    connection.execute(text("ALTER TABLE music_show DETACH PARTITION {}".format(name)))
+    # Venues and artists must remain deletable.
+    foreign_keys = connection.execute(
+        text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"
+        ),
+        {"name": name},
+    )
+    for (constraint,) in list(foreign_keys):
+        connection.execute(
+            text("ALTER TABLE {} DROP CONSTRAINT {}".format(name, constraint))
+        )
+    connection.execute(text("CREATE SCHEMA IF NOT EXISTS {}".format(schema)))
+    connection.execute(text("ALTER TABLE {} SET SCHEMA {}".format(name, schema)))
+    return venue_ids or [], artist_ids or []
+
+
+def partition_music_show(connection, ahead):
+    # Swaps the plain music_show table for a partitioned one holding the same
+    # rows, ids and indexes. Postgres requires the partition key to be part of
+    # the primary key, and so start_time to be set.
+    nulls = connection.execute(
+        text("SELECT count(*) FROM music_show WHERE start_time IS NULL")
+    ).scalar()
+    if nulls:
+        raise RuntimeError(
+            "{} shows have no start_time, set or delete them first.".format(nulls)
+        )
+    first = connection.execute(text("SELECT min(start_time) FROM music_show")).scalar()
+
+    connection.execute(text("ALTER TABLE music_show RENAME TO music_show_plain"))
+    connection.execute(
+        text("ALTER TABLE music_show_plain DROP CONSTRAINT music_show_pkey")
+    )
+    for index in MusicShow.__table__.indexes:
+        connection.execute(text("DROP INDEX {}".format(index.name)))
+    connection.execute(
+        text(
+            "CREATE TABLE music_show ("
+            "id INTEGER NOT NULL DEFAULT nextval('music_show_id_seq'), "
+            "venue_id INTEGER NOT NULL REFERENCES venue (id), "
+            "artist_id INTEGER NOT NULL REFERENCES artist (id), "
+            "start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL, "
+            "PRIMARY KEY (id, start_time)"
+            ") PARTITION BY RANGE (start_time)"
+        )
+    )
+    connection.execute(
+        text("CREATE TABLE music_show_default PARTITION OF music_show DEFAULT")
+    )
+    this_month = date.today().replace(day=1)
+    month = min((first or datetime.now()).date().replace(day=1), this_month)
+    while month <= add_months(this_month, ahead):
+        create_partition(connection, month)
+        month = add_months(month, 1)
+    for index in MusicShow.__table__.indexes:
+        index.create(connection)
+    connection.execute(text("ALTER SEQUENCE music_show_id_seq OWNED BY music_show.id"))
+    connection.execute(
+        text(
+            "INSERT INTO music_show (id, venue_id, artist_id, start_time) "
+            "SELECT id, venue_id, artist_id, start_time FROM music_show_plain"
+        )
+    )
+    connection.execute(text("DROP TABLE music_show_plain"))
+
+
+@event.listens_for(MusicShow.__table__, "after_create")
+def partition_created_table(target, connection, **kw):
+    # db.create_all, and so `flask init-db`, builds the same schema as the
+    # migrations.
+    if connection.dialect.name == "postgresql":
+        partition_music_show(connection, current_app.config["SHOW_PARTITIONS_AHEAD"])
+
+
+def maintain(ahead, retain=None, schema="archive", today=None):
+    """Create the monthly partitions up to ahead months from today, and
+    archive those entirely older than retain months, if given.
+
+    Past months still held by the default partition get their own as well.
+
+    Returns the names of the created and archived partitions.
+    """
+    this_month = (today or date.today()).replace(day=1)
+    horizon = add_months(this_month, ahead)
+    months = partitions(db.session)
+    # Past months too, for the shows imported since into the default partition.
+    wanted = {add_months(this_month, offset) for offset in range(ahead + 1)}
+    wanted.update(
+        month.date()
+        for (month,) in db.session.execute(
+            text(
+                "SELECT DISTINCT date_trunc('month', start_time) "
+                "FROM music_show_default WHERE start_time < :horizon"
+            ),
+            {"horizon": add_months(horizon, 1)},
+        )
+    )
+    created = []
+    for month in sorted(wanted - set(months)):
+        months[month] = create_partition(db.session, month)
+        created.append(months[month])
+    archived = []
+    if retain is not None:
+        venue_ids, artist_ids = set(), set()
+        cutoff = add_months(this_month, -retain)
+        for month, name in sorted(months.items()):
+            if add_months(month, 1) <= cutoff:
+                venues, artists = archive_partition(db.session, name, schema)
+                venue_ids.update(venues)
+                artist_ids.update(artists)
+                archived.append(name)
+        recount_ids(venue_ids, artist_ids)
+    db.session.commit()
+    return created, archived
+
+
+@click.command("partition-shows")
+@click.option(
+    "--ahead",
+    type=int,
+    help="Months to create ahead, SHOW_PARTITIONS_AHEAD by default.",
+)
+@click.option(
+    "--retain",
+    type=int,
+    help="Past months to keep, SHOW_PARTITIONS_RETAIN (all) by default.",
+)
+@with_appcontext
+def partition_command(ahead, retain):
+    """Create the music_show partitions ahead and archive the old ones.
+
+    Run it daily, e.g. from cron or the Heroku Scheduler.
+    """
+    config = current_app.config
+    if not is_postgres():
+        click.echo("music_show is a plain table on this database.")
+        return
+    if not is_partitioned(db.session):
+        raise click.ClickException(
+            "music_show is not partitioned, run flask db upgrade."
+        )
+
+    created, archived = maintain(
+        config["SHOW_PARTITIONS_AHEAD"] if ahead is None else ahead,
+        config["SHOW_PARTITIONS_RETAIN"] if retain is None else retain,
+        config["SHOW_ARCHIVE_SCHEMA"],
+    )
+    if archived:
+        page_cache.clear()
+    for name in created:
+        click.echo("Created {}.".format(name))
+    for name in archived:
+        click.echo("Archived {} to {}.".format(name, config["SHOW_ARCHIVE_SCHEMA"]))
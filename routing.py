@@ -0,0 +1,113 @@
+import random
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.pool import NullPool
+
+
+class RoutingSession(SignallingSession):
+    """Session reading from a replica during the read-only views.
+
+    The replica is picked by RoutingSQLAlchemy.read_only and kept in g for the
+    rest of the request. Flushes, and any request not marked read-only, use
+    the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get("replica_bind") if has_app_context() else None
+        if replica is not None and not self._flushing:
+            return get_state(self.app).db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+
+def database_written(*args):
+    if has_request_context():
+        g.database_written = True
+
+
+for name in ("after_flush", "after_bulk_update", "after_bulk_delete"):
+    event.listen(RoutingSession, name, database_written)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with tuned connection pools and read replicas.
+
+    SQLALCHEMY_REPLICA_URIS are registered as the binds "replica0",
+    "replica1"... The views decorated with read_only query one of them,
+    unless the client wrote within the last REPLICA_READ_YOUR_WRITES seconds:
+    the time of its last write is kept in its session so it keeps reading
+    from the primary until the replicas have caught up.
+    """
+
+    def init_app(self, app):
+        app.config.setdefault("DATABASE_POOL_SIZE", 5)
+        app.config.setdefault("DATABASE_MAX_OVERFLOW", 5)
+        app.config.setdefault("DATABASE_POOL_TIMEOUT", 10)
+        app.config.setdefault("DATABASE_POOL_RECYCLE", 1800)
+        app.config.setdefault("DATABASE_PGBOUNCER", False)
+        app.config.setdefault("SQLALCHEMY_REPLICA_URIS", [])
+        app.config.setdefault("REPLICA_READ_YOUR_WRITES", 10)
+
+        binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+        for key, uri in zip(replica_binds(app), app.config["SQLALCHEMY_REPLICA_URIS"]):
+            binds[key] = uri
+        app.config["SQLALCHEMY_BINDS"] = binds or None
+        if app.config["SQLALCHEMY_REPLICA_URIS"]:
+            app.after_request(self.remember_write)
+        super().init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith("sqlite"):
+            return
+        if app.config["DATABASE_PGBOUNCER"]:
+            # PgBouncer pools the server connections itself. Holding client
+            # connections here as well would only pin them to idle workers.
+            options.setdefault("poolclass", NullPool)
+            return
+        options.setdefault("pool_size", app.config["DATABASE_POOL_SIZE"])
+        options.setdefault("max_overflow", app.config["DATABASE_MAX_OVERFLOW"])
+        options.setdefault("pool_timeout", app.config["DATABASE_POOL_TIMEOUT"])
+        # Recycle before the server or a load balancer drops idle connections,
+        # and check the others on checkout, e.g. after a failover.
+        options.setdefault("pool_recycle", app.config["DATABASE_POOL_RECYCLE"])
+        options.setdefault("pool_pre_ping", True)
+
+    def read_only(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.replica_bind = self.choose_replica()
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    def choose_replica(self):
+        replicas = replica_binds(current_app)
+        if not replicas:
+            return None
+        wrote_at = session.get("wrote_at")
+        window = current_app.config["REPLICA_READ_YOUR_WRITES"]
+        if wrote_at is not None and time.time() - wrote_at < window:
+            # Also tells the page cache not to serve this client a page
+            # another client rendered from a lagging replica.
+            g.read_your_writes = True
+            return None
+        return random.choice(replicas)
+
+    def remember_write(self, response):
+        if g.pop("database_written", False):
+            session["wrote_at"] = time.time()
+        return response
+
+
+def replica_binds(app):
+    return [
+        "replica{}".format(index)
+        for index in range(len(app.config["SQLALCHEMY_REPLICA_URIS"]))
+    ]
@@ -1 +1 @@
-pm2 start app.py --name=fyyur-app --interpreter=python3 --watch
+FLASK_APP=app.py flask build-assets && FLASK_APP=app.py flask compile-templates && gunicorn wsgi:app
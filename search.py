@@ -0,0 +1,362 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import case, cast, desc, func, or_
+
+from forms import MusicGenre
+from models import db, is_postgres, Artist, GenreList, Venue
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def matching_genres(term):
+    term = term.lower()
+    return [genre.value for genre in MusicGenre if term in genre.value.lower()]
+
+
+class NgramIndex:
+    """In-process n-gram inverted index, used when pg_trgm is not available.
+
+    Every 1..n character gram of the indexed fields points to the ids of the
+    documents containing it, so a search only has to verify the documents
+    sharing all the grams of the term instead of scanning the whole table.
+    """
+
+    # Relevance of a match in each field, the name matters the most.
+    weights = {"name": 4.0, "city": 2.0, "genres": 1.5, "state": 1.0}
+
+    def __init__(self, n=3):
+        self.n = n
+        self._postings = defaultdict(set)
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def _grams(self, text):
+        grams = set()
+        for size in range(1, self.n + 1):
+            for start in range(len(text) - size + 1):
+                grams.add(text[start : start + size])
+        return grams
+
+    def _document_grams(self, fields):
+        grams = set()
+        for value in fields.values():
+            grams |= self._grams(value)
+        return grams
+
+    def add(self, doc_id, name, **fields):
+        fields = {key: (value or "").lower() for key, value in fields.items()}
+        fields["name"] = (name or "").lower()
+        with self._lock:
+            self._remove(doc_id)
+            self._documents[doc_id] = (name, fields)
+            for gram in self._document_grams(fields):
+                self._postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return
+        for gram in self._document_grams(document[1]):
+            postings = self._postings[gram]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[gram]
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+
+    def _score(self, term, fields):
+        score = 0.0
+        for key, value in fields.items():
+            position = value.find(term)
+            if position < 0:
+                continue
+            score += self.weights.get(key, 1.0)
+            if key == "name":
+                if position == 0:
+                    score += 2.0
+                elif value[position - 1] == " ":
+                    score += 1.0
+        return score
+
+    def search(self, term, limit):
+        term = term.lower().strip()
+        with self._lock:
+            if not term:
+                candidates = set(self._documents)
+            else:
+                if len(term) <= self.n:
+                    grams = [term]
+                else:
+                    grams = [
+                        term[start : start + self.n]
+                        for start in range(len(term) - self.n + 1)
+                    ]
+                grams.sort(key=lambda gram: len(self._postings.get(gram, ())))
+                candidates = set(self._postings.get(grams[0], ()))
+                for gram in grams[1:]:
+                    if not candidates:
+                        break
+                    candidates &= self._postings.get(gram, set())
+
+            results = []
+            for doc_id in candidates:
+                name, fields = self._documents[doc_id]
+                score = self._score(term, fields) if term else 0.0
+                if term and not score:
+                    continue
+                results.append((-score, fields["name"], doc_id, name))
+
+        results.sort()
+        return [{"id": doc_id, "name": name} for _, _, doc_id, name in results[:limit]]
+
+
+class EntitySearch:
+    """Name, city, state and genre search over a Venue or Artist model.
+
+    On Postgres the query is answered by the pg_trgm, genre GIN and
+    upper(state) indexes and ranked by trigram similarity. Other databases use
+    an NgramIndex built on first use and kept current by the write handlers in
+    app.py. Like the autocomplete index, it is rebuilt once older than
+    SEARCH_INDEX_MAX_AGE seconds to pick up the writes of the other workers
+    and the imports.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.index = NgramIndex()
+        self.loaded_at = None
+        self._load_lock = threading.Lock()
+
+    def _fields(self, name, city, state, genres):
+        return {
+            "name": name,
+            "city": city,
+            "state": state,
+            "genres": " ".join(genres or []),
+        }
+
+    def load(self):
+        # Searches keep using the previous index until the new one is swapped in.
+        index = NgramIndex()
+        model = self.model
+        rows = db.session.query(
+            model.id, model.name, model.city, model.state, model.genres
+        )
+        for row in rows:
+            index.add(row.id, **self._fields(row.name, row.city, row.state, row.genres))
+        self.index = index
+        self.loaded_at = time.monotonic()
+
+    def _refresh(self):
+        max_age = current_app.config.get("SEARCH_INDEX_MAX_AGE")
+        loaded_at = self.loaded_at
+        if loaded_at is not None and (
+            not max_age or time.monotonic() - loaded_at < max_age
+        ):
+            return
+        with self._load_lock:
+            if self.loaded_at is loaded_at:
+                self.load()
+
+    def add(self, entity):
+        if self.loaded_at is not None:
+            fields = self._fields(entity.name, entity.city, entity.state, entity.genres)
+            self.index.add(entity.id, **fields)
+
+    def remove(self, entity_id):
+        if self.loaded_at is not None:
+            self.index.remove(int(entity_id))
+
+    def reset(self):
+        with self._load_lock:
+            self.index = NgramIndex()
+            self.loaded_at = None
+
+    def search(self, term, limit):
+        term = (term or "").strip()
+        if is_postgres():
+            return self._search_postgres(term, limit)
+        self._refresh()
+        return self.index.search(term, limit)
+
+    def _search_postgres(self, term, limit):
+        model = self.model
+        query = db.session.query(model.id, model.name)
+        if not term:
+            rows = query.order_by(model.name).limit(limit).all()
+            return [{"id": row.id, "name": row.name} for row in rows]
+
+        pattern = "%{}%".format(escape_like(term))
+        conditions = [
+            model.name.ilike(pattern, escape="\\"),
+            model.city.ilike(pattern, escape="\\"),
+            func.upper(model.state) == term.upper(),
+        ]
+        genres = matching_genres(term)
+        if genres:
+            conditions.append(model.genres.overlap(cast(genres, GenreList)))
+
+        rank = (
+            case(
+                [
+                    (model.name.ilike(escape_like(term) + "%", escape="\\"), 2.0),
+                    (model.name.ilike(pattern, escape="\\"), 1.0),
+                ],
+                else_=0.0,
+            )
+            + func.similarity(model.name, term)
+        ).label("rank")
+        rows = (
+            query.filter(or_(*conditions))
+            .order_by(desc(rank), model.name)
+            .limit(limit)
+            .all()
+        )
+        return [{"id": row.id, "name": row.name} for row in rows]
+
+
+class PrefixIndex:
+    """Sorted in-process prefix index of venue and artist names.
+
+    Each name is stored once per word suffix ("the musical hop", "musical hop",
+    "hop") so a prefix lookup is a bisect followed by a short forward scan.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def _keys_for(self, kind, entity_id, name):
+        words = name.lower().split()
+        return {(" ".join(words[i:]), kind, entity_id) for i in range(len(words))}
+
+    def add(self, kind, entity_id, name):
+        with self._lock:
+            self._remove(kind, entity_id)
+            self._names[kind, entity_id] = name or ""
+            for key in self._keys_for(kind, entity_id, name or ""):
+                insort(self._keys, key)
+
+    def load(self, entities):
+        # Replaces the contents with the (kind, id, name) of entities, sorting
+        # the keys once rather than inserting them one at a time.
+        names = {}
+        keys = []
+        for kind, entity_id, name in entities:
+            names[kind, entity_id] = name or ""
+            keys.extend(self._keys_for(kind, entity_id, name or ""))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._names = names
+
+    def remove(self, kind, entity_id):
+        with self._lock:
+            self._remove(kind, entity_id)
+
+    def _remove(self, kind, entity_id):
+        name = self._names.pop((kind, entity_id), None)
+        if name is None:
+            return
+        for key in self._keys_for(kind, entity_id, name):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def clear(self):
+        with self._lock:
+            self._keys = []
+            self._names.clear()
+
+    def search(self, prefix, limit, kind=None):
+        prefix = " ".join(prefix.lower().split())
+        results = []
+        if not prefix:
+            return results
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, key_kind, entity_id = self._keys[position]
+                position += 1
+                if not key.startswith(prefix):
+                    break
+                if kind is not None and key_kind != kind:
+                    continue
+                if (key_kind, entity_id) in seen:
+                    continue
+                seen.add((key_kind, entity_id))
+                results.append(
+                    {
+                        "type": key_kind,
+                        "id": entity_id,
+                        "name": self._names[key_kind, entity_id],
+                    }
+                )
+        return results
+
+
+class Autocomplete:
+    """Venue and artist name suggestions served without a database round trip.
+
+    The index is loaded on first use, or before forking the workers, and then
+    kept current by the create, edit and delete handlers in app.py. Those only
+    reach the index of their own process, so it is rebuilt once older than
+    AUTOCOMPLETE_MAX_AGE seconds to pick up the writes of the other workers.
+    """
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self.loaded_at = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        # Searches keep using the previous index until the new one is swapped in.
+        index = PrefixIndex()
+        index.load(
+            (kind, entity_id, name)
+            for kind, model in (("venue", Venue), ("artist", Artist))
+            for entity_id, name in db.session.query(model.id, model.name)
+        )
+        self.index = index
+        self.loaded_at = time.monotonic()
+
+    def _refresh(self):
+        max_age = current_app.config.get("AUTOCOMPLETE_MAX_AGE")
+        loaded_at = self.loaded_at
+        if loaded_at is not None and (
+            not max_age or time.monotonic() - loaded_at < max_age
+        ):
+            return
+        with self._load_lock:
+            if self.loaded_at is loaded_at:
+                self.load()
+
+    def add(self, kind, entity):
+        self.index.add(kind, entity.id, entity.name)
+
+    def remove(self, kind, entity_id):
+        self.index.remove(kind, int(entity_id))
+
+    def search(self, prefix, limit, kind=None):
+        self._refresh()
+        return self.index.search(prefix, limit, kind=kind)
+
+
+venue_search = EntitySearch(Venue)
+artist_search = EntitySearch(Artist)
+autocomplete = Autocomplete()
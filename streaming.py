@@ -0,0 +1,114 @@
+import gzip
+import zlib
+
+from flask import (
+    Response,
+    current_app,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+)
+
+
+def gzip_chunks(chunks, min_size=16384):
+    # Compresses a stream of text or bytes chunks into gzip members of at
+    # least min_size input bytes, so clients can decode while it is produced.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= min_size:
+            yield compressor.compress(b"".join(buffer)) + compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+            buffer = []
+            size = 0
+    yield compressor.compress(b"".join(buffer)) + compressor.flush()
+
+
+def gzip_response(response, min_size=1024):
+    # Compresses a buffered response for clients accepting gzip. The ETag is
+    # made weak, the representation differing from the one it was computed on.
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or "gzip" not in request.accept_encodings
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    response.set_data(gzip.compress(body, 6))
+    response.headers["Content-Encoding"] = "gzip"
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+class Page:
+    """The rows of one page, read lazily from rows fetched per_page + 1 at a
+    time: has_next and last are known once the page has been iterated, e.g.
+    by the pager at the bottom of a template.
+    """
+
+    def __init__(self, rows, per_page=None):
+        self.rows = rows
+        self.per_page = per_page
+        self.has_next = False
+        self.last = None
+
+    def __iter__(self):
+        for index, row in enumerate(self.rows):
+            if index == self.per_page:
+                self.has_next = True
+                break
+            self.last = row
+            yield row
+
+
+def stream_template(template_name, **context):
+    # Flask 1.1 has no stream_template. The request context is kept while the
+    # template renders, and so reads the rows, as the response is sent.
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config["STREAM_BUFFER_EVENTS"])
+    return stream_with_context(stream)
+
+
+def render_streamed(template_name, **context):
+    """Render a template as it is sent when STREAM_LISTINGS is set, so the
+    layout reaches the browser before the rows are read.
+
+    Pages carrying flashed messages are rendered at once: the session, which
+    reading them changes, is saved before a streamed body.
+    """
+    if not current_app.config["STREAM_LISTINGS"] or "_flashes" in session:
+        return render_template(template_name, **context)
+    return Response(stream_template(template_name, **context), mimetype="text/html")
+
+
+def gzip_streamed_response(response):
+    # Streamed pages are compressed in members flushed as they are rendered.
+    if (
+        not response.is_streamed
+        or response.mimetype != "text/html"
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code == 200 and "gzip" in request.accept_encodings:
+        response.response = gzip_chunks(
+            response.response, current_app.config["STREAM_GZIP_MIN_SIZE"]
+        )
+        response.headers["Content-Encoding"] = "gzip"
+    return response
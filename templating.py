@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+# Compiled templates are kept as bytecode in TEMPLATE_CACHE_DIR, keyed by the
+# checksum of their source, so a new process loads them instead of compiling
+# them again and an edited template is simply compiled anew. The directory is
+# shared by the processes of a host, or by all of them when it is on a shared
+# volume. `flask compile-templates` fills it at deploy time, and warm_up loads
+# the TEMPLATE_PRELOAD templates before the workers accept requests.
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache writing its files atomically, as workers
+    starting together compile and write the same templates.
+    """
+
+    def dump_bytecode(self, bucket):
+        handle, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as stream:
+                bucket.write_bytecode(stream)
+            os.replace(path, os.path.join(self.directory, self.pattern % bucket.key))
+        except OSError:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def template_names(app, prefixes=None):
+    return [
+        name
+        for name in app.jinja_env.list_templates(extensions=["html"])
+        if prefixes is None or name.startswith(tuple(prefixes))
+    ]
+
+
+def load_templates(app, prefixes=None):
+    """Load, compiling them if need be, the templates under prefixes."""
+    names = template_names(app, prefixes)
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+class TemplateCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["template_cache"] = self
+        directory = app.config["TEMPLATE_CACHE_DIR"]
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = BytecodeCache(directory)
+
+    def preload(self, app):
+        prefixes = app.config["TEMPLATE_PRELOAD"]
+        if prefixes:
+            load_templates(app, prefixes)
+
+
+template_cache = TemplateCache()
+
+
+@click.command("compile-templates")
+@with_appcontext
+def compile_templates_command():
+    """Compile every template into the bytecode cache.
+
+    Run it at deploy time so new workers start from compiled templates. It
+    fails on the first template with a syntax error.
+    """
+    app = current_app._get_current_object()
+    if app.jinja_env.bytecode_cache is None:
+        raise click.ClickException("TEMPLATE_CACHE_DIR is not set.")
+    # Compile them all, not only those this process has already loaded.
+    app.jinja_env.cache.clear()
+    started = time.perf_counter()
+    try:
+        names = load_templates(app)
+    except TemplateSyntaxError as error:
+        raise click.ClickException(
+            "{}:{}: {}".format(error.name, error.lineno, error.message)
+        )
+    click.echo(
+        "{} templates compiled to {} in {:.0f} ms.".format(
+            len(names),
+            app.config["TEMPLATE_CACHE_DIR"],
+            (time.perf_counter() - started) * 1000,
+        )
+    )
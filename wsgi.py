@@ -0,0 +1,10 @@
+"""Production entry point, served by gunicorn with the settings of
+gunicorn.conf.py:
+
+    gunicorn wsgi:app
+"""
+
+from app import create_app, warm_up
+
+app = create_app("config.ProductionConfig")
+warm_up(app)